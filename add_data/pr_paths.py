@@ -1,14 +1,14 @@
 import os
+import sys
 
-from dotenv import load_dotenv
-from pymongo import MongoClient
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load MongoDB URI from environment variables
-load_dotenv()
-uri = os.getenv("MONGO_URI")
+from db import get_client  # noqa: E402
+from user.similarity import refresh_pathway_similarity  # noqa: E402
+from user.versions import bump_catalog_version  # noqa: E402
 
-# Connect to MongoDB
-client = MongoClient(uri)
+# Connect to MongoDB through the shared client, which loads MONGO_URI and checks the connection
+client = get_client()
 db = client["aus-pr"]
 # show existing collections
 print(db.list_collection_names())
@@ -16,13 +16,6 @@ print(db.list_collection_names())
 institutions_collection = db["institutions"]
 courses_collection = db["courses"]
 
-# Send a ping to confirm a successful connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
-
 # Create 35 skills (added 5 more skills)
 skills = [
     {"skill_name": "IT", "category": "Technology"},
@@ -93,7 +86,7 @@ locations = [
 db["locations"].insert_many(locations)
 
 # Fetch the courses from the database
-courses_data = db["courses"].find()
+courses_data = db["courses"].find({}, {"_id": 1})
 courses = list(courses_data)  # Convert to a list for easy access
 
 # Ensure courses are found
@@ -101,10 +94,10 @@ if not courses:
     raise Exception("No courses found in the database. Please insert courses first.")
 
 # Fetch the skills and locations from the database
-skills_data = db["skills"].find()
+skills_data = db["skills"].find({}, {"skill_name": 1})
 skills_dict = {skill["skill_name"]: skill["_id"] for skill in skills_data}
 
-locations_data = db["locations"].find()
+locations_data = db["locations"].find({}, {"location_name": 1})
 locations_dict = {loc["location_name"]: loc["_id"] for loc in locations_data}
 
 # Create 25 PR pathways (added 5 more pathways)
@@ -344,3 +337,10 @@ pr_pathways = [
 
 # Insert the PR pathways into the collection
 db["pr_pathways"].insert_many(pr_pathways)
+
+# Bump the catalog version so materialized recommendations are recomputed. New skills and locations come with
+# these pathways, so running apps reload the whole catalog
+bump_catalog_version(db)
+
+# Rebuild the similar pathways from the new catalog
+refresh_pathway_similarity(db)
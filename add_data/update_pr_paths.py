@@ -1,31 +1,24 @@
 import os
+import sys
 
-from dotenv import load_dotenv
-from pymongo import MongoClient
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load MongoDB URI from environment variables
-load_dotenv()
-uri = os.getenv("MONGO_URI")
+from db import get_client  # noqa: E402
+from user.similarity import refresh_pathway_similarity  # noqa: E402
+from user.versions import bump_catalog_version  # noqa: E402
 
-# Connect to MongoDB
-client = MongoClient(uri)
+# Connect to MongoDB through the shared client, which loads MONGO_URI and checks the connection
+client = get_client()
 db = client["aus-pr"]
 
-# Send a ping to confirm a successful connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
-
 # Fetch the courses, skills, and locations from the database
-courses_data = db["courses"].find()
+courses_data = db["courses"].find({}, {"_id": 1})
 courses = list(courses_data)
 
-skills_data = db["skills"].find()
+skills_data = db["skills"].find({}, {"skill_name": 1})
 skills_dict = {skill["skill_name"]: skill["_id"] for skill in skills_data}
 
-locations_data = db["locations"].find()
+locations_data = db["locations"].find({}, {"location_name": 1})
 locations_dict = {loc["location_name"]: loc["_id"] for loc in locations_data}
 
 # Ensure courses are found
@@ -217,15 +210,23 @@ pr_pathways_updates = [
 ]
 
 # Iterate over each pathway and update it
+updated_ids = []
 for pathway_update in pr_pathways_updates:
     pathway_name = pathway_update["pathway_name"]
     update_data = pathway_update["update_data"]
 
-    # Update the PR pathway by matching the pathway_name
+    # Update the PR pathway by matching the pathway_name, remembering which documents it touches
+    updated_ids += [pathway["_id"] for pathway in db["pr_pathways"].find({"pathway_name": pathway_name}, {"_id": 1})]
     result = db["pr_pathways"].update_many(
         {"pathway_name": pathway_name},
         {"$set": update_data}
     )
     print(f"Updated {result.matched_count} document(s) for pathway '{pathway_name}'")
 
+# Bump the catalog version so materialized recommendations are recomputed and running apps upsert only these pathways
+bump_catalog_version(db, updated_ids)
+
+# Rebuild the similar pathways from the new catalog
+refresh_pathway_similarity(db)
+
 print("All PR pathways have been successfully updated.")
@@ -3,6 +3,12 @@ from datetime import datetime
 import streamlit as st
 from bson.objectid import ObjectId
 
+from db import find_documents
+
+# Fields of a user shown in the account list and details
+ACCOUNT_PROJECTION = {"username": 1, "disabled": 1, "skills": 1, "profile.email": 1, "profile.first_name": 1,
+                      "profile.last_name": 1, "profile.date_of_birth": 1, "profile.location": 1}
+
 
 def manage_user_accounts(db):
     st.title("Admin - Manage User Accounts")
@@ -11,15 +17,15 @@ def manage_user_accounts(db):
     search_query = st.text_input("Search Users by Username or Email")
 
     if search_query:
-        users = db["users"].find({
+        users = find_documents(db["users"], {
             "$or": [
                 {"username": {"$regex": search_query, "$options": "i"}},
                 {"profile.email": {"$regex": search_query, "$options": "i"}}
             ]
-        })
+        }, ACCOUNT_PROJECTION)
     else:
         # List all users if no search query
-        users = db["users"].find()
+        users = find_documents(db["users"], {}, ACCOUNT_PROJECTION)
 
     # Display user list
     st.subheader("User List")
@@ -1,56 +1,148 @@
 from datetime import datetime
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 
+from user.catalog import get_catalog
+from user.materialized import refresh_materialized_recommendations
+from user.parameters import (DEFAULT_VARIANT, get_algorithm_parameters, get_parameter_variants, get_variant_shares,
+                             invalidate_algorithm_parameters)
+from user.recommadations import fetch_population_data
+from user.scoring import CATEGORIES, WeightSimulation
+
+CATEGORY_LABELS = ["Fully Qualified", "Partially Qualified", "Potential Interest"]
+HISTOGRAM_BINS = np.arange(0, 105, 5)
+
+
+# Function to build the population scoring model, reused across slider changes until the catalog changes
+@st.cache_resource(ttl=600, max_entries=2, show_spinner="Scoring all prospective migrants...")
+def load_weight_simulation(_db, database_name, catalog_version):
+    return WeightSimulation(fetch_population_data(_db), get_catalog(_db))
+
+
+# Function to show how candidate weights would move prospective migrants between categories
+def show_weight_simulation(db, parameters, candidate_parameters):
+    st.subheader("What-if Simulation")
+    catalog = get_catalog(db)
+    simulation = load_weight_simulation(db, db.name, catalog.version)
+    if simulation.size == 0:
+        st.info("There are no prospective migrants to simulate.")
+        return
+
+    current = simulation.rescore(parameters)
+    candidate = simulation.rescore(candidate_parameters)
+
+    # Users are placed in the category of their best pathway
+    st.write(f"Category of each migrant's best pathway ({simulation.size} migrants, {len(catalog)} pathways)")
+    transitions = np.bincount(current["user_categories"] * 3 + candidate["user_categories"],
+                              minlength=9).reshape(3, 3)
+    st.table(pd.DataFrame(transitions, index=[f"Current: {label}" for label in CATEGORY_LABELS],
+                          columns=[f"Candidate: {label}" for label in CATEGORY_LABELS]))
+
+    columns = st.columns(3)
+    for column, category, label in zip(columns, CATEGORIES, CATEGORY_LABELS):
+        column.metric(f"{label} pathways", candidate["pair_counts"][category],
+                      candidate["pair_counts"][category] - current["pair_counts"][category])
+
+    st.write("Best pathway score of each migrant")
+    st.bar_chart(pd.DataFrame({
+        "Current": np.histogram(current["top_scores"], HISTOGRAM_BINS)[0],
+        "Candidate": np.histogram(candidate["top_scores"], HISTOGRAM_BINS)[0]
+    }, index=[f"{start}-{start + 5}" for start in HISTOGRAM_BINS[:-1]]))
+
+
+# Function to score every variant against the migrant population and compare them side by side
+def show_variant_comparison(db):
+    st.subheader("Compare Variants")
+    shares = dict(get_variant_shares(db))
+    variants = get_parameter_variants(db)
+    if len(variants) < 2:
+        st.info("Save a named variant to compare it with the default parameters.")
+        return
+    if not st.button("Compare Variants"):
+        return
+
+    catalog = get_catalog(db)
+    simulation = load_weight_simulation(db, db.name, catalog.version)
+    if simulation.size == 0:
+        st.info("There are no prospective migrants to compare variants on.")
+        return
+
+    # All variants are scored in one pass over the population
+    results = simulation.compare_variants(list(variants.values()))
+    st.table(pd.DataFrame([{
+        "Variant": name,
+        "User Share (%)": 100 - sum(shares.values()) if name == DEFAULT_VARIANT else shares.get(name, 0),
+        **{f"{label} Pathways": result["pair_counts"][category]
+           for category, label in zip(CATEGORIES, CATEGORY_LABELS)},
+        **{f"{label} Migrants": result["user_counts"][category]
+           for category, label in zip(CATEGORIES, CATEGORY_LABELS)},
+        "Top 10 Overlap With Default (%)": round(result["top_k_overlap"] * 100, 1)
+    } for name, result in zip(variants, results)]))
+
 
 # Function to display admin panel for refining recommendation algorithm
 def admin_refine_algorithm(db):
     st.title("Admin - Refine Recommendation Algorithm")
 
+    # Parameters of the default or of a named variant, which users are assigned to by a hash of their id
+    variant = st.selectbox("Variant", [DEFAULT_VARIANT] + [name for name, _ in get_variant_shares(db)])
+    new_variant = st.text_input("Or create a new variant", "").strip()
+    if new_variant:
+        variant = new_variant
+
     # Fetch existing algorithm parameters from MongoDB or set defaults
-    parameters = db["algorithm_parameters"].find_one({"_id": "default"})
-    if not parameters:
-        # Default weights
-        parameters = {
-            "skill_weight": 0.25,
-            "experience_weight": 0.2,
-            "course_completion_weight": 0.15,
-            "location_weight": 0.1,
-            "pr_points_weight": 0.1,
-            "success_rate_weight": 0.1,
-            "difficulty_weight": 0.05,
-            "cost_weight": 0.05,
-            "duration_weight": 0.05
-        }
+    parameters = get_algorithm_parameters(db, variant=variant)
 
     st.subheader("Adjust Algorithm Weights")
 
     # Adjust each parameter
-    skill_weight = st.slider("Skill Match Weight", 0.0, 1.0, parameters.get("skill_weight", 0.25))
-    experience_weight = st.slider("Experience Match Weight", 0.0, 1.0, parameters.get("experience_weight", 0.2))
+    skill_weight = st.slider("Skill Match Weight", 0.0, 1.0, parameters["skill_weight"])
+    experience_weight = st.slider("Experience Match Weight", 0.0, 1.0, parameters["experience_weight"])
     course_completion_weight = st.slider("Course Completion Weight", 0.0, 1.0,
-                                         parameters.get("course_completion_weight", 0.15))
-    location_weight = st.slider("Location Match Weight", 0.0, 1.0, parameters.get("location_weight", 0.1))
-    pr_points_weight = st.slider("PR Points Match Weight", 0.0, 1.0, parameters.get("pr_points_weight", 0.1))
-    success_rate_weight = st.slider("Success Rate Weight", 0.0, 1.0, parameters.get("success_rate_weight", 0.1))
-    difficulty_weight = st.slider("Difficulty Level Weight", 0.0, 1.0, parameters.get("difficulty_weight", 0.05))
-    cost_weight = st.slider("Cost Weight", 0.0, 1.0, parameters.get("cost_weight", 0.05))
-    duration_weight = st.slider("Duration Weight", 0.0, 1.0, parameters.get("duration_weight", 0.05))
+                                         parameters["course_completion_weight"])
+    location_weight = st.slider("Location Match Weight", 0.0, 1.0, parameters["location_weight"])
+    pr_points_weight = st.slider("PR Points Match Weight", 0.0, 1.0, parameters["pr_points_weight"])
+    success_rate_weight = st.slider("Success Rate Weight", 0.0, 1.0, parameters["success_rate_weight"])
+    difficulty_weight = st.slider("Difficulty Level Weight", 0.0, 1.0, parameters["difficulty_weight"])
+    cost_weight = st.slider("Cost Weight", 0.0, 1.0, parameters["cost_weight"])
+    duration_weight = st.slider("Duration Weight", 0.0, 1.0, parameters["duration_weight"])
+
+    candidate_parameters = {
+        "skill_weight": skill_weight,
+        "experience_weight": experience_weight,
+        "course_completion_weight": course_completion_weight,
+        "location_weight": location_weight,
+        "pr_points_weight": pr_points_weight,
+        "success_rate_weight": success_rate_weight,
+        "difficulty_weight": difficulty_weight,
+        "cost_weight": cost_weight,
+        "duration_weight": duration_weight
+    }
+
+    # Preview the effect of the weights on every prospective migrant without saving them
+    if st.toggle("Simulate these weights"):
+        show_weight_simulation(db, parameters, candidate_parameters)
+
+    if variant != DEFAULT_VARIANT:
+        candidate_parameters["share"] = st.number_input("Share of users served this variant (%)", 0, 100,
+                                                        parameters.get("share", 0))
 
     if st.button("Save Changes"):
         # Save the updated parameters to MongoDB
-        db["algorithm_parameters"].update_one({"_id": "default"}, {
-            "$set": {
-                "skill_weight": skill_weight,
-                "experience_weight": experience_weight,
-                "course_completion_weight": course_completion_weight,
-                "location_weight": location_weight,
-                "pr_points_weight": pr_points_weight,
-                "success_rate_weight": success_rate_weight,
-                "difficulty_weight": difficulty_weight,
-                "cost_weight": cost_weight,
-                "duration_weight": duration_weight,
-                "updated_at": datetime.utcnow()
-            }
+        db["algorithm_parameters"].update_one({"_id": variant}, {
+            "$set": {**candidate_parameters, "updated_at": datetime.utcnow()},
+            # Bump the version so materialized recommendations are recomputed
+            "$inc": {"version": 1}
         }, upsert=True)
-        st.success("Algorithm parameters updated successfully!")
+        # Serve the new weights to the next recommendation in this process right away
+        invalidate_algorithm_parameters(db)
+        # Rescore the stored recommendations from their saved components instead of recomputing every match
+        with st.spinner("Refreshing stored recommendations..."):
+            refreshed = refresh_materialized_recommendations(db, variant)
+        st.success(f"Algorithm parameters updated successfully! {refreshed} stored recommendations refreshed.")
+        if sum(share for _, share in get_variant_shares(db)) > 100:
+            st.warning("Variant shares add up to more than 100%, so the last variants are served to fewer users.")
+
+    show_variant_comparison(db)
@@ -3,22 +3,27 @@ from datetime import datetime
 import streamlit as st
 from bson import ObjectId
 
+from db import find_document, find_documents
+
 
 # Function to display feedbacks and allow admin to reply
 def show_feedbacks_for_admin(db):
     st.subheader("Feedbacks from Migration Agents")
 
     # Fetch all feedbacks from the database
-    feedback_records = db["agent_feedback"].find()
+    feedback_records = find_documents(db["agent_feedback"], {}, {
+        "pathway_id": 1, "user_id": 1, "agent_id": 1, "accuracy": 1, "feasibility": 1, "comments": 1,
+        "submitted_at": 1, "reply": 1
+    })
 
     if feedback_records:
         feedback_list = []
 
         # Loop through each feedback and prepare it for display
         for record in feedback_records:
-            pathway = db["pr_pathways"].find_one({"_id": ObjectId(record["pathway_id"])})
-            user = db["users"].find_one({"_id": ObjectId(record["user_id"])})
-            agent = db["users"].find_one({"_id": ObjectId(record["agent_id"])})
+            pathway = find_document(db["pr_pathways"], {"_id": ObjectId(record["pathway_id"])}, {"pathway_name": 1})
+            user = find_document(db["users"], {"_id": ObjectId(record["user_id"])}, {"_id": 1})
+            agent = find_document(db["users"], {"_id": ObjectId(record["agent_id"])}, {"username": 1})
 
             # Check if user and agent exist to avoid accessing fields of None
             user_id = str(user['_id']) if user else "Unknown User"
@@ -42,29 +47,46 @@ def show_feedbacks_for_admin(db):
 
         # Display feedbacks
         for i, row in feedback_df.iterrows():
-            st.write(f"Pathway: {row['pathway_name']}, User: {row['user_id']}, Agent: {row['agent_name']}")
-            st.write(f"Accuracy: {row['accuracy']}, Feasibility: {row['feasibility']}")
-            st.write(f"Comments: {row['comments']}")
-            st.write(f"Submitted at: {row['submitted_at']}")
-            st.write(f"Admin Reply: {row['reply']}")
-
-            # Input for admin reply
-            reply = st.text_area(f"Reply to feedback for {row['pathway_name']}", value=row['reply'],
-                                 key=f"reply_{row['feedback_id']}")
-
-            # Submit button to save the reply
-            if st.button(f"Submit Reply for {row['pathway_name']}", key=f"submit_reply_{row['feedback_id']}"):
-                # Update the feedback entry with the admin's reply
-                db["agent_feedback"].update_one(
-                    {"_id": ObjectId(row['feedback_id'])},
-                    {"$set": {"reply": reply, "replied_at": datetime.utcnow()}}
-                )
-                st.success(f"Reply for {row['pathway_name']} submitted successfully.")
-                st.experimental_rerun()  # Refresh the page to show the updated reply
+            feedback_reply_form(row, db)
     else:
         st.write("No feedback found.")
 
 
+# Function to show one feedback with its reply form, which reruns on its own when the reply is submitted
+@st.fragment
+def feedback_reply_form(row, db):
+    # Set by a reply submitted on the previous run of this fragment. Fragment reruns keep the row read with the
+    # page, so only then is the reply read again, and kept for the fragment's later reruns
+    replied = st.session_state.pop(f"replied_{row['feedback_id']}", False)
+    if replied:
+        feedback = find_document(db["agent_feedback"], {"_id": ObjectId(row['feedback_id'])}, {"reply": 1}) or {}
+        st.session_state[f"saved_reply_{row['feedback_id']}"] = feedback.get("reply", row['reply'])
+    current_reply = st.session_state.get(f"saved_reply_{row['feedback_id']}", row['reply'])
+
+    st.write(f"Pathway: {row['pathway_name']}, User: {row['user_id']}, Agent: {row['agent_name']}")
+    st.write(f"Accuracy: {row['accuracy']}, Feasibility: {row['feasibility']}")
+    st.write(f"Comments: {row['comments']}")
+    st.write(f"Submitted at: {row['submitted_at']}")
+    st.write(f"Admin Reply: {current_reply}")
+
+    if replied:
+        st.success(f"Reply for {row['pathway_name']} submitted successfully.")
+
+    # Input for admin reply
+    reply = st.text_area(f"Reply to feedback for {row['pathway_name']}", value=current_reply,
+                         key=f"reply_{row['feedback_id']}")
+
+    # Submit button to save the reply
+    if st.button(f"Submit Reply for {row['pathway_name']}", key=f"submit_reply_{row['feedback_id']}"):
+        # Update the feedback entry with the admin's reply
+        db["agent_feedback"].update_one(
+            {"_id": ObjectId(row['feedback_id'])},
+            {"$set": {"reply": reply, "replied_at": datetime.utcnow()}}
+        )
+        st.session_state[f"replied_{row['feedback_id']}"] = True
+        st.rerun(scope="fragment")  # Refresh this feedback to show the updated reply
+
+
 import pandas as pd
 
 
@@ -73,13 +95,14 @@ def manage_user_inquiries(db):
     st.subheader("User Inquiries")
 
     # Fetch all inquiries from the database
-    inquiries = db["user_inquiries"].find({"status": "Pending"})
+    inquiries = find_documents(db["user_inquiries"], {"status": "Pending"},
+                               {"user_id": 1, "title": 1, "message": 1, "submitted_at": 1, "admin_reply": 1})
 
     if inquiries:
         inquiry_list = []
         # Loop through each inquiry and prepare it for display
         for inquiry in inquiries:
-            user = db["users"].find_one({"_id": ObjectId(inquiry["user_id"])})
+            user = find_document(db["users"], {"_id": ObjectId(inquiry["user_id"])}, {"username": 1})
             inquiry_list.append({
                 "user": user["username"] if user else "Unknown User",
                 "title": inquiry["title"],
@@ -93,22 +116,33 @@ def manage_user_inquiries(db):
         inquiries_df = pd.DataFrame(inquiry_list)
 
         for i, row in inquiries_df.iterrows():
-            st.write(f"Inquiry from {row['user']} ({row['submitted_at']}):")
-            st.write(f"**Title**: {row['title']}")
-            st.write(f"**Message**: {row['message']}")
-
-            # Admin reply section
-            reply = st.text_area(f"Reply to {row['user']}'s inquiry", value=row['admin_reply'],
-                                 key=f"reply_{row['inquiry_id']}")
-
-            # Submit reply button
-            if st.button(f"Submit Reply for {row['user']}'s inquiry", key=f"submit_reply_{row['inquiry_id']}"):
-                # Update the inquiry with the admin's reply and mark it as resolved
-                db["user_inquiries"].update_one(
-                    {"_id": ObjectId(row['inquiry_id'])},
-                    {"$set": {"admin_reply": reply, "status": "Resolved", "replied_at": datetime.utcnow()}}
-                )
-                st.success(f"Reply to {row['user']}'s inquiry submitted successfully.")
-                st.rerun()  # Refresh the page to show the updated reply
+            inquiry_reply_form(row, db)
     else:
         st.write("No pending inquiries.")
+
+
+# Function to show one inquiry with its reply form, which reruns on its own when the reply is submitted
+@st.fragment
+def inquiry_reply_form(row, db):
+    # A resolved inquiry leaves the pending list, so only its confirmation is shown
+    if st.session_state.pop(f"replied_{row['inquiry_id']}", False):
+        st.success(f"Reply to {row['user']}'s inquiry submitted successfully.")
+        return
+
+    st.write(f"Inquiry from {row['user']} ({row['submitted_at']}):")
+    st.write(f"**Title**: {row['title']}")
+    st.write(f"**Message**: {row['message']}")
+
+    # Admin reply section
+    reply = st.text_area(f"Reply to {row['user']}'s inquiry", value=row['admin_reply'],
+                         key=f"reply_{row['inquiry_id']}")
+
+    # Submit reply button
+    if st.button(f"Submit Reply for {row['user']}'s inquiry", key=f"submit_reply_{row['inquiry_id']}"):
+        # Update the inquiry with the admin's reply and mark it as resolved
+        db["user_inquiries"].update_one(
+            {"_id": ObjectId(row['inquiry_id'])},
+            {"$set": {"admin_reply": reply, "status": "Resolved", "replied_at": datetime.utcnow()}}
+        )
+        st.session_state[f"replied_{row['inquiry_id']}"] = True
+        st.rerun(scope="fragment")  # Refresh this inquiry to show it was resolved
@@ -2,6 +2,8 @@ import pandas as pd
 import streamlit as st
 from bson import ObjectId
 
+from db import find_document
+
 
 hide_table_row_index = """
             <style>
@@ -40,7 +42,7 @@ def generate_admin_report(db):
 
     saved_recs_list = []
     for record in saved_recommendations:
-        pathway = db["pr_pathways"].find_one({"_id": ObjectId(record["_id"])})
+        pathway = find_document(db["pr_pathways"], {"_id": ObjectId(record["_id"])}, {"pathway_name": 1})
         if pathway:
             saved_recs_list.append({
                 "pathway_name": pathway["pathway_name"],
@@ -69,7 +71,7 @@ def generate_admin_report(db):
 
     feedback_list = []
     for feedback in feedback_stats:
-        pathway = db["pr_pathways"].find_one({"_id": ObjectId(feedback["_id"])})
+        pathway = find_document(db["pr_pathways"], {"_id": ObjectId(feedback["_id"])}, {"pathway_name": 1})
         if pathway:
             feedback_list.append({
                 "pathway_name": pathway["pathway_name"],
@@ -4,7 +4,9 @@ import pandas as pd
 import streamlit as st
 from bson import ObjectId
 
-from user.recommadations import recommend_pr_pathways
+from db import find_document, find_documents
+from user.parameters import assign_variant, get_variant_shares
+from user.recommadations import recommend_pr_pathways, recommend_pr_pathways_batch
 
 
 hide_table_row_index = """
@@ -20,7 +22,10 @@ st.markdown(hide_table_row_index, unsafe_allow_html=True)
 # Function to fetch anonymized user profiles for agent to choose from
 def get_anonymized_user_profiles(db):
     # Fetch users with type 'prospective_migrant'
-    users = db["users"].find({"user_type": "prospective_migrant"})
+    users = find_documents(db["users"], {"user_type": "prospective_migrant"}, {
+        "profile.skills": 1, "profile.location": 1, "profile.employment": 1, "profile.education": 1,
+        "profile.preferences": 1
+    })
     anonymized_profiles = []
 
     for user in users:
@@ -73,33 +78,40 @@ def show_recommendations_for_feedback(user, recommendations, db):
 
             # Feedback section for each pathway
             for i, path in df.iterrows():
-                st.write(f"Provide Feedback for {path['pathway_name']}")
-
-                # Rating for accuracy and feasibility
-                accuracy = st.slider(f"Accuracy of Recommendation for {path['pathway_name']}", 1, 5, 3,
-                                     key=f"accuracy_{path['pathway_id']}")
-                feasibility = st.slider(f"Feasibility of Pathway for {path['pathway_name']}", 1, 5, 3,
-                                        key=f"feasibility_{path['pathway_id']}")
-
-                # Comment box for additional feedback
-                comments = st.text_area(f"Comments or Suggestions for {path['pathway_name']}", "",
-                                        key=f"comments_{path['pathway_id']}")
-
-                if st.button(f"Submit Feedback for {path['pathway_name']}", key=f"submit_{path['pathway_id']}"):
-                    feedback = {
-                        "user_id": user['user_id'],
-                        "pathway_id": path['pathway_id'],
-                        "agent_id": st.session_state.user["_id"],  # Assuming agent is logged in
-                        "accuracy": accuracy,
-                        "feasibility": feasibility,
-                        "comments": comments,
-                        "reply": "",
-                        "submitted_at": datetime.utcnow()
-                    }
-
-                    # Store feedback in the database
-                    db["agent_feedback"].insert_one(feedback)
-                    st.success(f"Feedback for {path['pathway_name']} submitted successfully.")
+                pathway_feedback_form(user, path, db)
+
+
+# Function to show the feedback form of one pathway, which reruns on its own so rating a pathway leaves the
+# recommendations above untouched
+@st.fragment
+def pathway_feedback_form(user, path, db):
+    st.write(f"Provide Feedback for {path['pathway_name']}")
+
+    # Rating for accuracy and feasibility
+    accuracy = st.slider(f"Accuracy of Recommendation for {path['pathway_name']}", 1, 5, 3,
+                         key=f"accuracy_{path['pathway_id']}")
+    feasibility = st.slider(f"Feasibility of Pathway for {path['pathway_name']}", 1, 5, 3,
+                            key=f"feasibility_{path['pathway_id']}")
+
+    # Comment box for additional feedback
+    comments = st.text_area(f"Comments or Suggestions for {path['pathway_name']}", "",
+                            key=f"comments_{path['pathway_id']}")
+
+    if st.button(f"Submit Feedback for {path['pathway_name']}", key=f"submit_{path['pathway_id']}"):
+        feedback = {
+            "user_id": user['user_id'],
+            "pathway_id": path['pathway_id'],
+            "agent_id": st.session_state.user["_id"],  # Assuming agent is logged in
+            "accuracy": accuracy,
+            "feasibility": feasibility,
+            "comments": comments,
+            "reply": "",
+            "submitted_at": datetime.utcnow()
+        }
+
+        # Store feedback in the database
+        db["agent_feedback"].insert_one(feedback)
+        st.success(f"Feedback for {path['pathway_name']} submitted successfully.")
 
 
 # Main function to let agent select a user and view recommendations
@@ -110,23 +122,64 @@ def show_agent_feedbacks(db):
     if selected_user:
         # Show recommendations for the selected user
         with st.spinner('Loading recommendations...'):
-            recommendations = recommend_pr_pathways({"_id": selected_user['user_id']}, db)  # Generating recommendations
-            # keep only first 5
-            recommendations = {k: v[:5] for k, v in recommendations.items()}
+            # Generating recommendations with the variant the user is served, keeping only the first 5 per category
+            variant = assign_variant(selected_user['user_id'], get_variant_shares(db))
+            recommendations = recommend_pr_pathways({"_id": selected_user['user_id']}, db, top_k=5, variant=variant)
             show_recommendations_for_feedback(selected_user, recommendations, db)
 
 
+# Function to show the feedback page of a migration agent
+def show_feedbacks_page(user, db):
+    st.write("Client Management Page for Migration Agents")
+    show_past_feedback(user, db)
+    show_agent_feedbacks(db)
+
+
+# Function to show the top pathways for all clients at once
+def show_agent_portfolio(db, top_n=3):
+    st.subheader("Client Portfolio")
+
+    anonymized_profiles = get_anonymized_user_profiles(db)
+
+    if not anonymized_profiles:
+        st.write("No clients found.")
+        return
+
+    # Generate recommendations for every client in one pass
+    with st.spinner('Loading recommendations...'):
+        recommendations = recommend_pr_pathways_batch([user['user_id'] for user in anonymized_profiles], db,
+                                                      top_k=top_n)
+
+    portfolio = []
+    for i, user in enumerate(anonymized_profiles):
+        paths = [path for paths in recommendations.get(user['user_id'], {}).values() for path in paths]
+        top_paths = sorted(paths, key=lambda path: path['score'], reverse=True)[:top_n]
+        portfolio.append({
+            "client": f"User {i + 1}",
+            "skills": user['skills'],
+            "experience_years": user['experience_years'],
+            "top_pathways": [f"{path['pathway_name']} ({path['score']:.1f})" for path in top_paths]
+        })
+
+    # Inject CSS with Markdown
+    st.markdown(hide_table_row_index, unsafe_allow_html=True)
+
+    st.table(pd.DataFrame(portfolio))
+
+
 # Function to view past feedback from migration agents
 def show_past_feedback(user, db):
     st.subheader(f"Past Feedback for the selected user")
 
     # Fetch feedback records from the database based on the agent_id
-    feedback_records = db["agent_feedback"].find({"agent_id": user['_id']})
+    feedback_records = find_documents(db["agent_feedback"], {"agent_id": user['_id']}, {
+        "pathway_id": 1, "accuracy": 1, "feasibility": 1, "comments": 1, "reply": 1, "submitted_at": 1
+    })
     feedback_list = []
 
     for record in feedback_records:
         # Find the pathway details using the pathway_id
-        pathway = db["pr_pathways"].find_one({"_id": ObjectId(record["pathway_id"])})
+        pathway = find_document(db["pr_pathways"], {"_id": ObjectId(record["pathway_id"])}, {"pathway_name": 1})
         if pathway:
             feedback_list.append({
                 "pathway_name": pathway['pathway_name'],
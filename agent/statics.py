@@ -1,6 +1,8 @@
 import pandas as pd
 import streamlit as st
 
+from db import find_document
+
 
 hide_table_row_index = """
             <style>
@@ -34,7 +36,7 @@ def show_migration_agent_statistics(db):
 
     pathway_stats_list = []
     for stat in pathway_stats:
-        pathway = db["pr_pathways"].find_one({"_id": stat["_id"]})
+        pathway = find_document(db["pr_pathways"], {"_id": stat["_id"]}, {"pathway_name": 1})
         if pathway:
             pathway_stats_list.append({
                 "pathway_name": pathway.get("pathway_name", "Unknown Pathway"),
@@ -0,0 +1,43 @@
+"""Report the cold import time of every page module, each measured in a fresh interpreter.
+
+Run from the repository root:
+
+    python benchmarks/import_times.py
+"""
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_registry import PAGES  # noqa: E402
+
+# Modules main.py imports before any page is chosen
+STARTUP_MODULES = ["streamlit", "db", "page_registry", "user.user_management"]
+
+MEASURE = (
+    "import importlib, time\n"
+    "start = time.perf_counter()\n"
+    "importlib.import_module({module!r})\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+# Function to time the import of one module in a fresh interpreter
+def cold_import_time(module, root):
+    result = subprocess.run([sys.executable, "-c", MEASURE.format(module=module)], cwd=root,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    page_modules = sorted({module for module, _, _ in PAGES.values()})
+
+    print(f"{'module':<32} {'cold import (ms)':>18}")
+    for module in STARTUP_MODULES + page_modules:
+        print(f"{module:<32} {cold_import_time(module, root) * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Benchmark the recommender against deterministic synthetic catalogs in an in-memory MongoDB.
+
+Needs mongomock (pip install mongomock). Run from the repository root:
+
+    python benchmarks/recommender_bench.py --sizes 1000 10000 100000
+    python benchmarks/recommender_bench.py --sizes 1000000 --users 5
+    python benchmarks/recommender_bench.py --save benchmarks/baselines/v1.json
+    python benchmarks/recommender_bench.py --compare benchmarks/baselines/v1.json
+
+Each size reports per-stage timings (fetch, resolve, score, categorize), the end-to-end cold and warm
+recommend_pr_pathways latency, the peak traced memory and the MongoDB round trips of every stage.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import mongomock
+except ImportError:
+    sys.exit("The recommender benchmark needs mongomock: pip install mongomock")
+
+from bson import ObjectId  # noqa: E402
+
+from user import catalog as catalog_module  # noqa: E402
+from user.catalog import fetch_pr_pathways  # noqa: E402
+from user.parameters import invalidate_algorithm_parameters, load_algorithm_parameters  # noqa: E402
+from user.recommadations import (calculate_total_score, categorize_pathways, fetch_user_data,  # noqa: E402
+                                 recommend_pr_pathways)
+from user.result_cache import recommendation_cache  # noqa: E402
+from user.scoring import PathwayCatalog, score_pathways  # noqa: E402
+from user.scoring_profile import build_scoring_profile  # noqa: E402
+from user.vocabulary import load_vocabularies  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+SKILL_COUNT = 500
+COURSE_COUNT = 200
+LOCATION_COUNT = 30
+TOP_K = 10
+
+# Above this size the per-pathway Python scoring loop is skipped
+LEGACY_SCORE_LIMIT = 100000
+
+
+class CountingCollection:
+    """Collection proxy counting the queries sent to MongoDB."""
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in ("find", "find_one", "aggregate", "count_documents", "insert_one", "insert_many",
+                    "update_one", "update_many", "replace_one", "delete_one", "bulk_write"):
+            def counted(*args, **kwargs):
+                self._counter["round_trips"] += 1
+                return attribute(*args, **kwargs)
+            return counted
+        return attribute
+
+
+class CountingDatabase:
+    """Database proxy handing out counting collections."""
+
+    def __init__(self, database):
+        self._database = database
+        self.name = database.name
+        self.counter = {"round_trips": 0}
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self.counter)
+
+
+# Function to fill an in-memory database with a deterministic synthetic catalog and population
+def populate(database, size, users, seed):
+    rng = random.Random(seed)
+
+    skills = [{"_id": ObjectId(), "skill_name": f"Skill {i}"} for i in range(SKILL_COUNT)]
+    courses = [{"_id": ObjectId(), "course_name": f"Course {i}"} for i in range(COURSE_COUNT)]
+    locations = [{"_id": ObjectId(), "location_name": f"City {i}", "state": f"State {i % 8}"}
+                 for i in range(LOCATION_COUNT)]
+    database["skills"].insert_many(skills)
+    database["courses"].insert_many(courses)
+    database["locations"].insert_many(locations)
+
+    pathways = [{
+        "pathway_name": f"Pathway {i}",
+        "required_skills": [skill["_id"] for skill in rng.sample(skills, rng.randint(1, 4))],
+        "recommended_courses": [course["_id"] for course in rng.sample(courses, rng.randint(0, 3))],
+        "preferred_locations": [location["_id"] for location in rng.sample(locations, rng.randint(1, 3))],
+        "required_experience_years": rng.randint(0, 6),
+        "pr_points_threshold": rng.choice([0, 60, 65, 70, 75, 80]),
+        "success_rate": rng.randint(40, 95),
+        "difficulty_level": rng.randint(1, 10),
+        "estimated_cost": rng.randint(5000, 60000),
+        "estimated_duration": rng.randint(6, 60)
+    } for i in range(size)]
+    database["pr_pathways"].insert_many(pathways)
+
+    item_ids = {
+        "skills": {skill["skill_name"]: skill["_id"] for skill in skills},
+        "courses": {course["course_name"]: course["_id"] for course in courses},
+        "locations": {f"{location['location_name']} - {location['state']}": location["_id"] for location in locations}
+    }
+    user_ids = []
+    for _ in range(users):
+        profile = {
+            "skills": [skill["skill_name"] for skill in rng.sample(skills, rng.randint(0, 10))],
+            "employment": [{"job_title": "", "company": "", "years_in_current_role": rng.randint(0, 5)}],
+            "education": [{"degree_or_course_name": course["course_name"]}
+                          for course in rng.sample(courses, rng.randint(0, 2))],
+            "preferences": {"location_preference": [f"{location['location_name']} - {location['state']}"
+                                                    for location in rng.sample(locations, rng.randint(0, 3))]}
+        }
+        pr_points = rng.choice([0, 60, 70, 80])
+        # The scoring profile is what update_profile stores next to the profile and fetch_user_data reads
+        user = {"_id": ObjectId(), "user_type": "prospective_migrant", "profile": profile, "pr_points": pr_points,
+                "scoring_profile": build_scoring_profile(profile, pr_points, item_ids)}
+        database["users"].insert_one(user)
+        user_ids.append(user["_id"])
+
+    return user_ids
+
+
+# Function to time a stage and count its round trips
+def measure(stage, results, db, function, repeat=1):
+    before = db.counter["round_trips"]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = function()
+    results[stage] = {
+        "seconds": (time.perf_counter() - start) / repeat,
+        "round_trips": (db.counter["round_trips"] - before) / repeat
+    }
+    return value
+
+
+# Function to drop every in-process cache so the next recommendation is cold
+def clear_caches():
+    catalog_module._snapshots.clear()
+    recommendation_cache.clear()
+    invalidate_algorithm_parameters()
+
+
+def run_size(size, users, seed):
+    db = CountingDatabase(mongomock.MongoClient()[f"bench_{size}"])
+    user_ids = populate(db._database, size, users, seed)
+    clear_caches()
+
+    stages = {}
+    tracemalloc.start()
+
+    def fetch():
+        return fetch_user_data(user_ids[0], db), fetch_pr_pathways(db), load_algorithm_parameters(db)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_data, pathways, algorithm_parameters = measure("fetch", stages, db, fetch)
+    catalog = measure("resolve", stages, db, lambda: PathwayCatalog(pathways, load_vocabularies(db)))
+    scores = measure("score", stages, db, lambda: score_pathways(user_data, catalog, algorithm_parameters),
+                     repeat=users)
+    measure("categorize", stages, db, lambda: categorize_pathways(catalog, scores, TOP_K), repeat=users)
+
+    if size <= LEGACY_SCORE_LIMIT:
+        # Per-pathway Python scoring, for comparison with the vectorized engine
+        measure("legacy_score", stages, db, lambda: [
+            calculate_total_score(50, 50, 50, 50, 50, catalog.difficulty_level[i], catalog.success_rate[i],
+                                  catalog.cost[i], catalog.duration[i], algorithm_parameters)
+            for i in range(len(catalog))])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        clear_caches()
+        measure("end_to_end_cold", stages, db, lambda: recommend_pr_pathways({"_id": user_ids[0]}, db, TOP_K))
+        measure("end_to_end_warm", stages, db,
+                lambda: [recommend_pr_pathways({"_id": user_id}, db, TOP_K) for user_id in user_ids])
+    stages["end_to_end_warm"]["seconds"] /= len(user_ids)
+    stages["end_to_end_warm"]["round_trips"] /= len(user_ids)
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"pathways": size, "users": users, "peak_memory_bytes": peak, "stages": stages}
+
+
+# Function to print the results, with the change against a saved baseline when given
+def report(results, baseline=None):
+    baseline_sizes = {run["pathways"]: run for run in (baseline or {}).get("runs", [])}
+    for run in results["runs"]:
+        print(f"\n{run['pathways']} pathways, {run['users']} users, "
+              f"peak memory {run['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+        previous = baseline_sizes.get(run["pathways"], {}).get("stages", {})
+        for stage, measured in run["stages"].items():
+            line = f"  {stage:<18} {measured['seconds'] * 1000:>12.2f} ms {measured['round_trips']:>8.1f} round trips"
+            if stage in previous and previous[stage]["seconds"] > 0:
+                change = measured["seconds"] / previous[stage]["seconds"] - 1
+                line += f"  ({change:+.0%} vs baseline)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalog sizes to benchmark")
+    parser.add_argument("--users", type=int, default=20, help="synthetic users per catalog size")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the synthetic data")
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    args = parser.parse_args()
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": args.seed,
+        "runs": [run_size(size, args.users, args.seed) for size in args.sizes]
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    report(results, baseline)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
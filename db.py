@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.mongo_client import MongoClient
+from pymongo.server_api import ServerApi
+
+load_dotenv()
+
+# Name of the application database
+DATABASE_NAME = os.getenv("MONGO_DB_NAME", "aus-pr")
+
+# Number of threads issuing independent reads at the same time
+FETCH_THREADS = int(os.getenv("MONGO_FETCH_THREADS", "8"))
+
+# Reads without a projection raise instead of fetching whole documents, for test runs
+REQUIRE_PROJECTIONS = os.getenv("MONGO_REQUIRE_PROJECTIONS", "") == "1"
+
+# The single pooled client of this process, created on first use
+_client = None
+_client_lock = threading.Lock()
+
+# Threads shared by concurrent reads, created on first use
+_executor = None
+
+
+# Collection whose reads must name the fields they use
+class ProjectedCollection(Collection):
+    # find_one goes through find as well
+    def find(self, *args, **kwargs):
+        check_projection(self, args[1] if len(args) > 1 else kwargs.get("projection"))
+        return super().find(*args, **kwargs)
+
+
+# Database handing out collections that refuse unprojected reads
+class ProjectedDatabase(Database):
+    def __getitem__(self, name):
+        return ProjectedCollection(self, name)
+
+    def get_collection(self, name, *args, **kwargs):
+        return ProjectedCollection(self, name, False, *args, **kwargs)
+
+
+# Client handing out databases whose collections refuse unprojected reads, used when projections are required
+class ProjectedMongoClient(MongoClient):
+    def __getitem__(self, name):
+        return ProjectedDatabase(self, name)
+
+    def get_database(self, name=None, *args, **kwargs):
+        return ProjectedDatabase(self, name or super().get_database().name, *args, **kwargs)
+
+
+# Function to build the client options from the environment
+def client_options():
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+    }
+
+    # Optional wire compression, e.g. "zstd,snappy,zlib"
+    compressors = os.getenv("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+
+    return options
+
+
+# Function to get the process-wide MongoDB client
+def get_client():
+    """Return the pooled MongoDB client of this process, creating and pinging it only once.
+
+    Streamlit re-runs main.py on every interaction but keeps imported modules, so the client survives reruns.
+    When projections are required, every find through the client is checked, not only the helpers below.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client_class = ProjectedMongoClient if REQUIRE_PROJECTIONS else MongoClient
+                client = client_class(os.getenv("MONGO_URI"), server_api=ServerApi('1'), **client_options())
+
+                # Send a ping to confirm a successful connection
+                try:
+                    client.admin.command('ping')
+                    print("Pinged your deployment. You successfully connected to MongoDB!")
+                except Exception as e:
+                    print(e)
+
+                _client = client
+    return _client
+
+
+# Function to get the application database
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+# Function to get the threads shared by concurrent reads
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FETCH_THREADS, thread_name_prefix="mongo-fetch")
+    return _executor
+
+
+# Function to run independent reads at the same time
+def fetch_concurrently(*functions):
+    """Call the given functions concurrently and return their results in order.
+
+    The first function runs in the calling thread. A function still queued when its result is needed runs in
+    the calling thread as well, so nested calls never wait on a pool they are blocking.
+    """
+    futures = [get_executor().submit(function) for function in functions[1:]]
+    results = [functions[0]()]
+    for function, future in zip(functions[1:], futures):
+        results.append(function() if future.cancel() else future.result())
+    return results
+
+
+# Function to refuse reads that do not name the fields they use, when projections are required
+def check_projection(collection, projection):
+    if REQUIRE_PROJECTIONS and not projection:
+        raise ValueError(f"Read from {collection.name} without a projection")
+
+
+# Function to find the documents matching a query, returning only the projected fields
+def find_documents(collection, query, projection, **options):
+    """Cursor over the documents of collection matching query.
+
+    Every read names the fields it uses, so MongoDB sends and the driver decodes only those.
+    """
+    check_projection(collection, projection)
+    return collection.find(query, projection, **options)
+
+
+# Function to find the first document matching a query, returning only the projected fields
+def find_document(collection, query, projection, **options):
+    check_projection(collection, projection)
+    return collection.find_one(query, projection, **options)
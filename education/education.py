@@ -3,12 +3,14 @@ from datetime import datetime
 import streamlit as st
 from pymongo import DESCENDING
 
+from db import find_document, find_documents
+
 
 def manage_educational_programs(user, db):
     st.subheader("Manage Your Educational Programs")
 
     # Fetch the institution based on the user's ID (educator)
-    institution = db["institutions"].find_one({"user_id": user["_id"]})
+    institution = find_document(db["institutions"], {"user_id": user["_id"]}, {"institution_name": 1})
 
     if not institution:
         st.error("No institution found for this user.")
@@ -17,7 +19,9 @@ def manage_educational_programs(user, db):
     institution_id = institution["_id"]
 
     # Fetch courses associated with this educator's institution
-    courses = db["courses"].find({"institution_id": institution_id}).sort("updated_at", DESCENDING)
+    courses = find_documents(db["courses"], {"institution_id": institution_id}, {
+        "course_name": 1, "location": 1, "cost": 1, "duration": 1, "pr_points": 1, "capacity": 1, "start_date": 1
+    }).sort("updated_at", DESCENDING)
 
     # Display existing courses
     st.write(f"Courses for {institution['institution_name']}:")
@@ -1,6 +1,8 @@
 import pandas as pd
 import streamlit as st
 
+from db import find_document
+
 
 hide_table_row_index = """
             <style>
@@ -35,7 +37,7 @@ def show_anonymized_interest_statistics(db):
     stats_list = []
     for stat in interest_stats:
         # Fetch the pathway details for each pathway_id
-        pathway = db["pr_pathways"].find_one({"_id": stat["_id"]})
+        pathway = find_document(db["pr_pathways"], {"_id": stat["_id"]}, {"pathway_name": 1})
         if pathway:
             stats_list.append({
                 "pathway_name": pathway.get("pathway_name", "Unknown Pathway"),
@@ -0,0 +1,42 @@
+import importlib
+
+# Sidebar menu of each user type
+MENUS = {
+    "prospective_migrant": ["Dashboard", "Update Profile", "Inquery", "Logout"],
+    "migration_agent": ["Dashboard", "Feedbacks", "Portfolio", "Logout"],
+    "education_provider": ["Dashboard", "Manage Educational Programs", "Logout"],
+    "administrator": ["Dashboard", "Refine Recommendation Algorithm", "Manage Users", "Reply", "Inquery", "Logout"]
+}
+
+# Page of each (user type, menu choice), as (module, function, names of the arguments it takes)
+PAGES = {
+    ("prospective_migrant", "Dashboard"): ("user.dashboard", "show_migrant_dashboard", ("user", "db")),
+    ("prospective_migrant", "Update Profile"): ("user.questions", "update_profile",
+                                                ("user", "users_collection", "db")),
+    ("prospective_migrant", "Inquery"): ("user.inquery", "user_inquiry_section", ("user", "db")),
+    ("migration_agent", "Dashboard"): ("agent.statics", "show_migration_agent_statistics", ("db",)),
+    ("migration_agent", "Feedbacks"): ("agent.feedback", "show_feedbacks_page", ("user", "db")),
+    ("migration_agent", "Portfolio"): ("agent.feedback", "show_agent_portfolio", ("db",)),
+    ("education_provider", "Dashboard"): ("education.statics", "show_full_anonymized_statistics", ("db",)),
+    ("education_provider", "Manage Educational Programs"): ("education.education", "manage_educational_programs",
+                                                            ("user", "db")),
+    ("administrator", "Dashboard"): ("admin.statics", "admin_report_page", ("db",)),
+    ("administrator", "Refine Recommendation Algorithm"): ("admin.refine_algo", "admin_refine_algorithm", ("db",)),
+    ("administrator", "Manage Users"): ("admin.manage_user_account", "manage_user_accounts", ("db",)),
+    ("administrator", "Reply"): ("admin.reply", "show_feedbacks_for_admin", ("db",)),
+    ("administrator", "Inquery"): ("admin.reply", "manage_user_inquiries", ("db",))
+}
+
+
+# Function to import a page's module on first use and return the page function
+def load_page(user_type, choice):
+    module_name, function_name, _ = PAGES[(user_type, choice)]
+    # import_module returns the cached module after the first import, so module-level code runs once
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+# Function to render a page with the arguments it expects
+def show_page(user_type, choice, **context):
+    _, _, argument_names = PAGES[(user_type, choice)]
+    page = load_page(user_type, choice)
+    page(*(context[name] for name in argument_names))
@@ -0,0 +1,83 @@
+import threading
+
+from db import fetch_concurrently, find_documents
+from user.scoring import PathwayCatalog
+from user.versions import fetch_catalog_changes, fetch_catalog_version
+from user.vocabulary import load_vocabularies
+
+# Fields of pr_pathways needed for scoring and display
+PATHWAY_PROJECTION = {
+    "pathway_name": 1,
+    "required_skills": 1,
+    "recommended_courses": 1,
+    "preferred_locations": 1,
+    "required_experience_years": 1,
+    "pr_points_threshold": 1,
+    "success_rate": 1,
+    "difficulty_level": 1,
+    "estimated_cost": 1,
+    "estimated_duration": 1
+}
+
+# Above this many changed pathways a full reload is cheaper than upserting them one by one
+UPSERT_LIMIT = 200
+
+# Compiled catalog snapshots per database name, replaced as a whole when the catalog version changes
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+# Function to fetch PR pathways
+def fetch_pr_pathways(db):
+    pathways = find_documents(db['pr_pathways'], {}, PATHWAY_PROJECTION)
+    return list(pathways)
+
+
+# Function to compile the pathway catalog with its names resolved
+def load_catalog(db, version=None):
+    if version is None:
+        version = fetch_catalog_version(db)
+    pathways, vocabularies = fetch_concurrently(lambda: fetch_pr_pathways(db), lambda: load_vocabularies(db))
+    return PathwayCatalog(pathways, vocabularies, version)
+
+
+# Function to apply the pathways changed since a snapshot to a copy of it
+def update_catalog(db, snapshot, version):
+    """Copy of snapshot with the pathways changed up to version upserted, or None when it must be reloaded.
+
+    The snapshot itself is never modified, as other sessions keep serving it until the new one is swapped in.
+    """
+    pathway_ids = fetch_catalog_changes(db, snapshot.version, version)
+    if pathway_ids is None or len(pathway_ids) > UPSERT_LIMIT:
+        return None
+
+    pathways = list(find_documents(db['pr_pathways'], {"_id": {"$in": pathway_ids}}, PATHWAY_PROJECTION))
+    # Deleted pathways leave rows behind and new skills, courses or locations are missing from the vocabularies
+    if len(pathways) != len(pathway_ids) or not all(snapshot.resolves(pathway) for pathway in pathways):
+        return None
+
+    catalog = snapshot.copy(version)
+    for pathway in pathways:
+        catalog.upsert(pathway)
+    return catalog
+
+
+# Function to fetch the compiled catalog, reloading it only when the catalog version changed
+def get_catalog(db):
+    """Return this process's compiled catalog snapshot, updating it when the catalog version moved.
+
+    Recorded pathway changes are applied to a copy of the current snapshot, anything else reloads the catalog.
+    """
+    version = fetch_catalog_version(db)
+    snapshot = _snapshots.get(db.name)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    # One session rebuilds while the others keep serving the previous snapshot until the swap
+    with _snapshots_lock:
+        snapshot = _snapshots.get(db.name)
+        if snapshot is None or snapshot.version != version:
+            updated = update_catalog(db, snapshot, version) if snapshot is not None else None
+            snapshot = updated if updated is not None else load_catalog(db, version)
+            _snapshots[db.name] = snapshot
+        return snapshot
@@ -0,0 +1,123 @@
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import find_document, find_documents, get_db
+from user.catalog import get_catalog
+
+# Number of co-saved pathways kept ready to serve per pathway
+ALSO_SAVED_LIMIT = 20
+
+# Saves newer than this are left to the next run, so saves still being written are never skipped
+SAVE_LAG = timedelta(minutes=1)
+
+# Document in the job_checkpoints collection recording the last save folded into the co-occurrence counts
+COOCCURRENCE_CHECKPOINT_ID = "pathway_cooccurrence"
+
+
+# Function to count the pathway pairs saved by the same users since the last run
+def count_new_cooccurrences(saves, checkpoint, until):
+    """Pairs of pathways co-saved through saves made after checkpoint and up to until, counted both ways.
+
+    Each user's saves are (pathway id, saved_at) pairs. A new save pairs with every earlier save of the same
+    user, so each pair is counted once however many runs it takes for both saves to arrive.
+    """
+    counts = Counter()
+    for user_saves in saves:
+        new = [pathway_id for pathway_id, saved_at in user_saves if checkpoint < saved_at <= until]
+        old = [pathway_id for pathway_id, saved_at in user_saves if saved_at <= checkpoint]
+        for position, pathway_id in enumerate(new):
+            for other_id in old + new[:position]:
+                if other_id != pathway_id:
+                    counts[(pathway_id, other_id)] += 1
+                    counts[(other_id, pathway_id)] += 1
+    return counts
+
+
+# Function to fold the saves made since the last run into the pathway_cooccurrence collection
+def update_pathway_cooccurrence(db, batch_size=1000):
+    """Add the co-occurrences of new saves to the stored counts and refresh the top lists of the pathways touched.
+
+    Returns the number of pathways whose counts changed.
+    """
+    db["saved_recommendations"].create_index("saved_recommendations.saved_at")
+    checkpoint = (find_document(db["job_checkpoints"], {"_id": COOCCURRENCE_CHECKPOINT_ID}, {"saved_at": 1}) or {}).get(
+        "saved_at", datetime(1970, 1, 1))
+    until = datetime.utcnow() - SAVE_LAG
+
+    # Only users with a save after the checkpoint are read
+    documents = find_documents(
+        db["saved_recommendations"],
+        {"saved_recommendations": {"$elemMatch": {"saved_at": {"$gt": checkpoint, "$lte": until}}}},
+        {"saved_recommendations.pathway_id": 1, "saved_recommendations.saved_at": 1}
+    )
+    counts = count_new_cooccurrences(
+        ([(save["pathway_id"], save["saved_at"]) for save in document.get("saved_recommendations", [])]
+         for document in documents),
+        checkpoint, until)
+
+    increments = {}
+    for (pathway_id, other_id), count in counts.items():
+        increments.setdefault(pathway_id, {})[f"counts.{other_id}"] = count
+    requests = [UpdateOne({"_id": pathway_id}, {"$inc": pathway_increments}, upsert=True)
+                for pathway_id, pathway_increments in increments.items()]
+    for start in range(0, len(requests), batch_size):
+        db["pathway_cooccurrence"].bulk_write(requests[start:start + batch_size], ordered=False)
+
+    refresh_also_saved(db, list(increments), batch_size)
+
+    db["job_checkpoints"].update_one({"_id": COOCCURRENCE_CHECKPOINT_ID},
+                                     {"$set": {"saved_at": until, "updated_at": datetime.utcnow()}}, upsert=True)
+    return len(increments)
+
+
+# Function to rebuild the served top lists of the given pathways from their counts
+def refresh_also_saved(db, pathway_ids, batch_size=1000):
+    catalog = get_catalog(db)
+    requests = []
+    for start in range(0, len(pathway_ids), batch_size):
+        rows = find_documents(db["pathway_cooccurrence"], {"_id": {"$in": pathway_ids[start:start + batch_size]}},
+                              {"counts": 1})
+        for row in rows:
+            top = sorted(row.get("counts", {}).items(), key=lambda item: -item[1])
+            also_saved = []
+            for other_id, count in top:
+                # Pathways no longer in the catalog are skipped
+                position = catalog.rows.get(ObjectId(other_id))
+                if position is None:
+                    continue
+                also_saved.append({"pathway_id": ObjectId(other_id),
+                                   "pathway_name": catalog.records[position].pathway_name,
+                                   "count": count})
+                if len(also_saved) == ALSO_SAVED_LIMIT:
+                    break
+            requests.append(UpdateOne({"_id": row["_id"]}, {"$set": {"also_saved": also_saved}}))
+    for start in range(0, len(requests), batch_size):
+        db["pathway_cooccurrence"].bulk_write(requests[start:start + batch_size], ordered=False)
+
+
+# Function to fetch the pathways most often saved together with the given ones
+def fetch_also_saved(pathway_ids, db, limit=5):
+    """Pathways co-saved with the given pathways, most co-saved first, leaving out the given pathways."""
+    pathway_ids = [ObjectId(pathway_id) for pathway_id in pathway_ids]
+    rows = find_documents(db["pathway_cooccurrence"], {"_id": {"$in": pathway_ids}}, {"also_saved": 1})
+
+    also_saved = {}
+    for row in rows:
+        for other in row.get("also_saved", []):
+            if other["pathway_id"] in pathway_ids:
+                continue
+            entry = also_saved.setdefault(other["pathway_id"], {**other, "count": 0})
+            entry["count"] += other["count"]
+    return sorted(also_saved.values(), key=lambda other: -other["count"])[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold new saved pathways into the co-occurrence counts.")
+    parser.parse_args()
+
+    changed = update_pathway_cooccurrence(get_db())
+    print(f"Co-occurrence counts updated for {changed} pathways.")
@@ -0,0 +1,66 @@
+import pandas as pd
+import streamlit as st
+
+from user.collaborative import fetch_also_saved
+from user.materialized import fetch_user_recommendation_versions, get_user_recommendations
+from user.recommadations import show_recommendations, show_saved_recommendations
+
+
+# Function to serve a user's recommendations from session state until something they depend on changes
+def get_session_recommendations(user, db):
+    """Reuse this session's recommendations across reruns while the profile, catalog and weights are unchanged."""
+    versions = fetch_user_recommendation_versions(user, db)
+    memo = st.session_state.get("recommendations_memo")
+    if memo is not None and memo["user_id"] == user["_id"] and memo["versions"] == versions:
+        return memo["recommendations"]
+
+    recommendations = get_user_recommendations(user, db, versions)
+    st.session_state.recommendations_memo = {
+        "user_id": user["_id"],
+        "versions": versions,
+        "recommendations": recommendations
+    }
+    return recommendations
+
+
+# Function to show the saved pathways and recommendations, which rerun together and on their own when one of
+# their widgets is used
+@st.fragment
+def pathways_panel(user, db):
+    # Saving or removing a pathway changes both the saved pathways and which recommendations can be saved, so
+    # both are drawn by this one fragment, the recommendations being served from the session memo
+    rec_saved = show_saved_recommendations(user, db)
+
+    # Show recommendations with a loading spinner
+    with st.spinner('Loading recommendations...'):
+        recommendations = get_session_recommendations(user, db)
+        show_recommendations(recommendations, user, db, rec_saved)
+
+    # Pathways other migrants saved together with this user's saved pathways
+    if len(rec_saved) > 0:
+        also_saved = fetch_also_saved(rec_saved['pathway_id'].tolist(), db)
+        if also_saved:
+            st.subheader("Migrants Like You Also Saved")
+            st.table(pd.DataFrame([{
+                "pathway_name": path['pathway_name'],
+                "saved_together": path['count']
+            } for path in also_saved]))
+
+
+# Function to show the prospective migrant dashboard
+def show_migrant_dashboard(user, db):
+    # st.write("Manage your migration profile from the sidebar.")
+    # Show saved recommendations when the page loads
+    pathways_panel(user, db)
+
+    st.markdown("""
+        ---
+        **Disclaimer**: The recommendations provided by this system are based on the available data and algorithmic processing. 
+        While we strive to ensure the accuracy and relevance of the information, we cannot guarantee that every recommendation 
+        will be fully applicable to your situation. The system's results should be considered as guidance only and not as an 
+        authoritative decision-making tool. 
+
+        **Affiliation**: This system is not officially affiliated with any immigration authorities or government institutions. 
+        All the data used is for educational and guidance purposes, and users should consult official resources for 
+        detailed and legally binding information.
+        """)
@@ -0,0 +1,303 @@
+import argparse
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+from bson import Binary
+from pymongo import ReplaceOne, UpdateOne
+
+from db import fetch_concurrently, find_document, find_documents, get_db
+from user.catalog import get_catalog
+from user.parameters import (DEFAULT_VARIANT, assign_variant, get_algorithm_parameters, get_parameter_variants,
+                             get_variant_shares)
+from user.recommadations import (SCORING_PROJECTION, categorize_pathways, complete_scoring_users, extract_user_data,
+                                 fetch_algorithm_parameters, fetch_user_data, rank_and_categorize_pathways)
+from user.scoring import WeightSimulation, item_pairs, score_users
+from user.versions import fetch_recommendation_versions
+
+# Number of pathways kept per category in a materialized document
+MATERIALIZED_LIMIT = 10
+
+# Number of documents sent in one bulk write when refreshing materialized recommendations
+REFRESH_BATCH_SIZE = 1000
+
+# Number of users handed to a worker at once by the nightly job
+JOB_CHUNK_SIZE = 500
+
+# Largest users x pathways score matrix a worker builds at once
+JOB_MAX_CELLS = 2000000
+
+# Document in the job_checkpoints collection recording how far the nightly job got
+MATERIALIZE_CHECKPOINT_ID = "materialize_recommendations"
+
+# Catalog and parameter variants of a job worker, set once when the worker starts
+_worker_state = {}
+
+
+# Function to pack the weight-independent score components of a user
+def encode_features(user_data, catalog, pairs=None):
+    """Store what a weight change needs to rescore a user without recomputing any match.
+
+    Success rate, difficulty, cost and duration components come from the catalog and experience and PR points
+    components from two numbers, so only the skill, course and location matches of the pathways sharing an item
+    with the user are kept, as float32 triples next to their int32 catalog rows. Those pathways and components
+    can be passed in when they were computed for a batch of users.
+    """
+    if pairs is None:
+        _, pathways, components = item_pairs([user_data], catalog)
+    else:
+        pathways, components = pairs
+    return {
+        "catalog": catalog.version,
+        "layout": catalog.layout(),
+        "experience_years": user_data['experience_years'],
+        "pr_points": user_data['pr_points'],
+        "cost_limit": user_data.get('cost_limit', 0),
+        "duration_limit": user_data.get('duration_limit', 0),
+        "pathways": Binary(pathways.tobytes()),
+        "components": Binary(components.tobytes())
+    }
+
+
+# Function to unpack stored score components into catalog rows and a pairs x 3 matrix
+def decode_features(features):
+    pathways = np.frombuffer(features["pathways"], dtype=np.int32)
+    components = np.frombuffer(features["components"], dtype=np.float32).reshape(-1, 3)
+    return pathways, components
+
+
+# Function to recompute and store a user's recommendations
+def materialize_user_recommendations(user, db, versions=None, variant=DEFAULT_VARIANT):
+    """Recompute the recommendations of a user and store them stamped with the versions they were built from."""
+    # Read the versions before computing so a concurrent edit leaves the document stale, not wrongly fresh
+    if versions is None:
+        versions = fetch_recommendation_versions(user["_id"], db, variant)
+
+    # The recommendations and their features are built from the same profile and catalog snapshot
+    user_data, catalog, algorithm_parameters = fetch_concurrently(
+        lambda: fetch_user_data(user["_id"], db),
+        lambda: get_catalog(db),
+        lambda: fetch_algorithm_parameters(db, versions["variant"])
+    )
+    recommendations = rank_and_categorize_pathways(user_data, catalog, algorithm_parameters, db,
+                                                   MATERIALIZED_LIMIT)
+    features = encode_features(user_data, catalog)
+
+    db["user_recommendations"].replace_one({"_id": user["_id"]}, {
+        "versions": versions,
+        "recommendations": recommendations,
+        "features": features,
+        "computed_at": datetime.utcnow()
+    }, upsert=True)
+
+    return recommendations
+
+
+# Function to rescore every materialized document from its stored components after a weight change
+def refresh_materialized_recommendations(db, variant=DEFAULT_VARIANT):
+    """Apply the current parameters of a variant to its materialized recommendations built on the current catalog.
+
+    Documents built on another catalog are left alone and recomputed when next requested. Returns the number of
+    documents refreshed.
+    """
+    catalog = get_catalog(db)
+    algorithm_parameters = get_algorithm_parameters(db, variant=variant)
+    documents = list(find_documents(
+        db["user_recommendations"],
+        {"versions.variant": variant, "features.catalog": catalog.version, "features.layout": catalog.layout()},
+        {"features": 1}
+    ))
+    if not documents:
+        return 0
+
+    users_data, pair_users, pair_pathways, pair_components = [], [], [], []
+    for position, document in enumerate(documents):
+        features = document["features"]
+        pathways, components = decode_features(features)
+        users_data.append({"experience_years": features["experience_years"], "pr_points": features["pr_points"]})
+        pair_users.append(np.full(len(pathways), position, dtype=np.int32))
+        pair_pathways.append(pathways)
+        pair_components.append(components)
+    simulation = WeightSimulation(users_data, catalog, pairs=(
+        np.concatenate(pair_users), np.concatenate(pair_pathways), np.concatenate(pair_components)))
+
+    computed_at = datetime.utcnow()
+    requests = []
+    for document, scores in zip(documents, simulation.user_scores(algorithm_parameters)):
+        # Pathways outside the user's cost and duration limits stay out of the refreshed list
+        rows = catalog.allowed_rows(document["features"])
+        if rows is not None:
+            scores = scores[rows]
+        requests.append(UpdateOne({"_id": document["_id"]}, {"$set": {
+            "recommendations": categorize_pathways(catalog, scores, MATERIALIZED_LIMIT, rows),
+            "versions.parameters": algorithm_parameters.get("version", 0),
+            "computed_at": computed_at
+        }}))
+        if len(requests) == REFRESH_BATCH_SIZE:
+            db["user_recommendations"].bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        db["user_recommendations"].bulk_write(requests, ordered=False)
+
+    return len(documents)
+
+
+# Function to give a job worker the catalog and parameter variants it scores against
+def _init_worker(catalog, variants):
+    _worker_state["catalog"] = catalog
+    _worker_state["variants"] = variants
+
+
+# Function to build the materialized documents of one chunk of users inside a job worker
+def _materialize_chunk(chunk):
+    """Score a chunk of (user id, versions, user data) triples and return (user id, document) pairs."""
+    catalog = _worker_state["catalog"]
+    variants = _worker_state["variants"]
+
+    positions_by_group = {}
+    for position, (_, versions, user_data) in enumerate(chunk):
+        group = (versions["variant"], user_data['cost_limit'], user_data['duration_limit'])
+        positions_by_group.setdefault(group, []).append(position)
+
+    # Users of the same variant and limits are scored together, in blocks that keep the score matrix bounded
+    recommendations = [None] * len(chunk)
+    features = [None] * len(chunk)
+    block_size = max(1, JOB_MAX_CELLS // max(1, len(catalog)))
+    for (variant, _, _), positions in positions_by_group.items():
+        rows = catalog.allowed_rows(chunk[positions[0]][2])
+        for start in range(0, len(positions), block_size):
+            block = positions[start:start + block_size]
+            block_users = [chunk[position][2] for position in block]
+            scores = score_users(block_users, catalog, variants[variant], rows)
+            # Item matches of the whole block in one pass, ordered by user so each user's pairs are one slice
+            pair_users, pair_pathways, pair_components = item_pairs(block_users, catalog)
+            bounds = np.searchsorted(pair_users, np.arange(len(block) + 1))
+            for offset, (position, user_scores) in enumerate(zip(block, scores)):
+                recommendations[position] = categorize_pathways(catalog, user_scores, MATERIALIZED_LIMIT, rows)
+                user_pairs = slice(bounds[offset], bounds[offset + 1])
+                features[position] = encode_features(chunk[position][2], catalog,
+                                                     (pair_pathways[user_pairs], pair_components[user_pairs]))
+
+    computed_at = datetime.utcnow()
+    return [(user_id, {
+        "versions": versions,
+        "recommendations": user_recommendations,
+        "features": user_features,
+        "computed_at": computed_at
+    }) for (user_id, versions, _), user_recommendations, user_features in zip(chunk, recommendations, features)]
+
+
+# Function to stream prospective migrants as chunks of scoring inputs stamped with their versions
+def _user_chunks(users, catalog, variants, shares, chunk_size, db):
+    while True:
+        chunk = []
+        for user in complete_scoring_users(islice(users, chunk_size), db):
+            variant = assign_variant(user["_id"], shares)
+            chunk.append((user["_id"], {
+                "profile": user.get("profile_version", 0),
+                "catalog": catalog.version,
+                "variant": variant,
+                "parameters": variants[variant].get("version", 0)
+            }, extract_user_data(user)))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Function to materialize the recommendations of every prospective migrant
+def materialize_all(db, chunk_size=JOB_CHUNK_SIZE, workers=None, restart=False):
+    """Recompute and store the recommendations of all prospective migrants with a pool of worker processes.
+
+    Users are streamed in _id order and scored in chunks by workers that all start from the same loaded catalog.
+    The last user written is checkpointed after every chunk, so an interrupted run resumes where it stopped
+    unless restart is set. Returns the number of users materialized by this run.
+    """
+    workers = workers or os.cpu_count() or 1
+    catalog = get_catalog(db)
+    catalog.layout()
+    shares = get_variant_shares(db)
+    variants = get_parameter_variants(db)
+
+    checkpoint = find_document(db["job_checkpoints"], {"_id": MATERIALIZE_CHECKPOINT_ID},
+                               {"last_user_id": 1, "completed": 1}) or {}
+    query = {"user_type": "prospective_migrant"}
+    if not restart and not checkpoint.get("completed", True) and checkpoint.get("last_user_id") is not None:
+        query["_id"] = {"$gt": checkpoint["last_user_id"]}
+        print(f"Resuming after user {checkpoint['last_user_id']}")
+    else:
+        db["job_checkpoints"].replace_one({"_id": MATERIALIZE_CHECKPOINT_ID}, {
+            "last_user_id": None,
+            "completed": False,
+            "started_at": datetime.utcnow()
+        }, upsert=True)
+
+    users = find_documents(db["users"], query, {**SCORING_PROJECTION, "profile_version": 1}).sort("_id", 1)
+    chunks = _user_chunks(users, catalog, variants, shares, chunk_size, db)
+
+    materialized = 0
+    started = time.monotonic()
+    pool = multiprocessing.Pool(workers, _init_worker, (catalog, variants)) if workers > 1 else None
+    try:
+        if pool is None:
+            _init_worker(catalog, variants)
+        while True:
+            # A bounded window of chunks keeps the stream from being read ahead into memory
+            window = list(islice(chunks, workers * 2))
+            if not window:
+                break
+            results = pool.imap(_materialize_chunk, window) if pool is not None else map(_materialize_chunk, window)
+            for documents in results:
+                db["user_recommendations"].bulk_write(
+                    [ReplaceOne({"_id": user_id}, document, upsert=True) for user_id, document in documents],
+                    ordered=False)
+                db["job_checkpoints"].update_one({"_id": MATERIALIZE_CHECKPOINT_ID},
+                                                 {"$set": {"last_user_id": documents[-1][0]}})
+                materialized += len(documents)
+                elapsed = time.monotonic() - started
+                print(f"{materialized} users materialized, {materialized / elapsed:.1f} users/sec")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    db["job_checkpoints"].update_one({"_id": MATERIALIZE_CHECKPOINT_ID}, {
+        "$set": {"completed": True, "finished_at": datetime.utcnow()}
+    })
+    return materialized
+
+
+# Function to fetch the versions a user's recommendations must match, for the variant the user is served
+def fetch_user_recommendation_versions(user, db):
+    # Each user is served the variant their id hashes to, so comparing variants costs no extra scoring
+    variant = assign_variant(user["_id"], get_variant_shares(db))
+    return fetch_recommendation_versions(user["_id"], db, variant)
+
+
+# Function to fetch a user's recommendations, recomputing them only when something they depend on changed
+def get_user_recommendations(user, db, versions=None):
+    """Serve the materialized recommendations of a user, recomputing them when a version is out of date."""
+    if versions is None:
+        versions = fetch_user_recommendation_versions(user, db)
+    materialized = find_document(db["user_recommendations"], {"_id": user["_id"]},
+                                 {"versions": 1, "recommendations": 1})
+
+    if materialized and materialized.get("versions") == versions:
+        return materialized["recommendations"]
+
+    return materialize_user_recommendations(user, db, versions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize the recommendations of every prospective migrant.")
+    parser.add_argument("--chunk-size", type=int, default=JOB_CHUNK_SIZE, help="users per worker task")
+    parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    parser.add_argument("--restart", action="store_true", help="start over instead of resuming an unfinished run")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    total = materialize_all(get_db(), args.chunk_size, args.workers, args.restart)
+    elapsed = time.monotonic() - started
+    print(f"Materialized {total} users in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} users/sec)")
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+import time
+
+from db import find_document, find_documents
+
+# Default weights used until an administrator saves algorithm parameters
+DEFAULT_ALGORITHM_PARAMETERS = {
+    "skill_weight": 0.25,
+    "experience_weight": 0.2,
+    "course_completion_weight": 0.15,
+    "location_weight": 0.1,
+    "pr_points_weight": 0.1,
+    "success_rate_weight": 0.1,
+    "difficulty_weight": 0.05,
+    "cost_weight": 0.05,
+    "duration_weight": 0.05
+}
+
+# Fields of an algorithm_parameters document
+PARAMETERS_PROJECTION = dict.fromkeys([*DEFAULT_ALGORITHM_PARAMETERS, "version", "updated_at", "share"], 1)
+
+# Document id of the parameters served to users not assigned to another variant
+DEFAULT_VARIANT = "default"
+
+# Seconds the cached parameters are served before their version is checked again
+PARAMETERS_TTL = float(os.getenv("ALGORITHM_PARAMETERS_TTL", "30"))
+
+# Cached parameters per (database name, variant), as (parameters, time of the last check)
+_cache = {}
+
+# Cached variant shares per database name, as (shares, time of the last check)
+_variants_cache = {}
+_cache_lock = threading.Lock()
+
+
+# Function to load algorithm parameters from MongoDB, falling back to the defaults
+def load_algorithm_parameters(db, variant=DEFAULT_VARIANT):
+    parameters = find_document(db["algorithm_parameters"], {"_id": variant}, PARAMETERS_PROJECTION)
+    if parameters:
+        return {**DEFAULT_ALGORITHM_PARAMETERS, **parameters}
+    return dict(DEFAULT_ALGORITHM_PARAMETERS)
+
+
+# Function to fetch algorithm parameters through the in-process cache
+def get_algorithm_parameters(db, ttl=None, variant=DEFAULT_VARIANT):
+    """Return the algorithm parameters, re-reading them only when the TTL expired and their version changed."""
+    ttl = PARAMETERS_TTL if ttl is None else ttl
+    cached = _cache.get((db.name, variant))
+    now = time.monotonic()
+
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+
+    with _cache_lock:
+        parameters = cached[0] if cached is not None else None
+        if parameters is not None:
+            # A cheap version check avoids reloading parameters nobody changed
+            current = find_document(db["algorithm_parameters"], {"_id": variant}, {"version": 1, "updated_at": 1}) or {}
+            if (current.get("version"), current.get("updated_at")) != (parameters.get("version"),
+                                                                       parameters.get("updated_at")):
+                parameters = None
+
+        if parameters is None:
+            parameters = load_algorithm_parameters(db, variant)
+
+        _cache[(db.name, variant)] = (parameters, now)
+        return parameters
+
+
+# Function to fetch the share of users assigned to each named variant
+def get_variant_shares(db, ttl=None):
+    """Return (variant, percentage of users) pairs sorted by name, re-reading them when the TTL expired."""
+    ttl = PARAMETERS_TTL if ttl is None else ttl
+    cached = _variants_cache.get(db.name)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < ttl:
+        return cached[0]
+
+    variants = find_documents(db["algorithm_parameters"], {"_id": {"$ne": DEFAULT_VARIANT}}, {"share": 1})
+    shares = sorted((variant["_id"], variant.get("share", 0)) for variant in variants)
+    _variants_cache[db.name] = (shares, now)
+    return shares
+
+
+# Function to fetch the parameters of the default and every named variant
+def get_parameter_variants(db):
+    return {variant: get_algorithm_parameters(db, variant=variant)
+            for variant in [DEFAULT_VARIANT] + [name for name, _ in get_variant_shares(db)]}
+
+
+# Function to pick the variant a user is served
+def assign_variant(user_id, shares):
+    """Map a user to a variant through a stable hash of their id, so the same user always gets the same variant.
+
+    Users fall in one of 100 buckets, and each variant takes the next share of them in name order. Users past
+    the last share get the default parameters.
+    """
+    bucket = int(hashlib.sha256(str(user_id).encode()).hexdigest(), 16) % 100
+    threshold = 0
+    for variant, share in shares:
+        threshold += share
+        if bucket < threshold:
+            return variant
+    return DEFAULT_VARIANT
+
+
+# Function to drop cached parameters and variant shares after they were saved
+def invalidate_algorithm_parameters(db=None):
+    with _cache_lock:
+        if db is None:
+            _cache.clear()
+            _variants_cache.clear()
+        else:
+            for key in [key for key in _cache if key[0] == db.name]:
+                del _cache[key]
+            _variants_cache.pop(db.name, None)
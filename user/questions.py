@@ -2,6 +2,9 @@ from datetime import datetime
 
 import streamlit as st
 
+from db import find_documents
+from user.scoring_profile import build_scoring_profile, load_item_ids
+
 # Nationalities list
 nationalities = [
     "Afghan", "Albanian", "Algerian", "American", "Andorran", "Angolan", "Antiguan", "Argentine", "Armenian",
@@ -34,7 +37,7 @@ def update_profile(user, users_collection, db):
     profile = user.get('profile', {})
 
     # Fetch available courses from the courses table
-    available_courses = [course['course_name'] for course in db["courses"].find()]
+    available_courses = [course['course_name'] for course in find_documents(db["courses"], {}, {"course_name": 1})]
 
     # Profile fields
     new_first_name = st.text_input("First Name", profile.get('first_name', ''))
@@ -112,7 +115,7 @@ def update_profile(user, users_collection, db):
     st.subheader("Skills")
 
     # Skills with limit of 10
-    available_skills = [skill['skill_name'] for skill in db["skills"].find()]
+    available_skills = [skill['skill_name'] for skill in find_documents(db["skills"], {}, {"skill_name": 1})]
     current_skills = profile.get('skills', [])
     new_skills = st.multiselect("Skills (max 10)", available_skills, default=current_skills)
 
@@ -193,8 +196,10 @@ def update_profile(user, users_collection, db):
     st.subheader("Preferences")
 
     # Fetch available locations and institutions from MongoDB
-    location_options = [f"{loc['location_name']} - {loc['state']}" for loc in db["locations"].find()]
-    study_preferences = [f"{inst['institution_name']} - {inst['location']}" for inst in db["institutions"].find()]
+    location_options = [f"{loc['location_name']} - {loc['state']}"
+                        for loc in find_documents(db["locations"], {}, {"location_name": 1, "state": 1})]
+    study_preferences = [f"{inst['institution_name']} - {inst['location']}"
+                         for inst in find_documents(db["institutions"], {}, {"institution_name": 1, "location": 1})]
 
     # Preferences
     current_location_preferences = profile.get('preferences', {}).get('location_preference', [])
@@ -234,7 +239,13 @@ def update_profile(user, users_collection, db):
             },
             "updated_at": datetime.utcnow()
         }
+        # Compact copy of the scoring inputs, read by the recommender instead of the whole profile
+        updates["scoring_profile"] = build_scoring_profile(updates["profile"], user.get('pr_points', 0),
+                                                           load_item_ids(db))
 
         # Update the user in the database
-        users_collection.update_one({"_id": user['_id']}, {"$set": updates})
+        # Bump the profile version so materialized recommendations are recomputed
+        users_collection.update_one({"_id": user['_id']}, {"$set": updates, "$inc": {"profile_version": 1}})
+        # Recommendations memoized for this session no longer match the profile
+        st.session_state.pop("recommendations_memo", None)
         st.success("Profile updated successfully")
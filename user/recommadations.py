@@ -1,80 +1,72 @@
-import os
 from datetime import datetime
 
 import pandas as pd
 import streamlit as st
 from bson import ObjectId  # Import ObjectId
-from dotenv import load_dotenv
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 
-# Load environment variables
-load_dotenv()
-uri = os.getenv("MONGO_URI")
-print(uri)
+from db import fetch_concurrently, find_document, find_documents, get_db
+from user.scoring import PathwayCatalog, score_pathways, score_users, categorize_scores
+from user.catalog import get_catalog
+from user.parameters import DEFAULT_VARIANT, assign_variant, get_algorithm_parameters, get_variant_shares
+from user.result_cache import profile_fingerprint, recommendation_cache
+from user.scoring_profile import PROFILE_PROJECTION, derive_scoring_profile
+from user.similarity import fetch_similar_pathways
+from user.vocabulary import load_vocabularies
 
-# Create a new client and connect to the server
-client = MongoClient(uri, server_api=ServerApi('1'))
-db = client["aus-pr"]
-users_collection = db["users"]
-print("Connected to MongoDB")
 
-# Send a ping to confirm a successful connection
-try:
-    client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(e)
+# Fields of a user document read by extract_user_data
+SCORING_PROJECTION = {"scoring_profile": 1}
+
+
+# Function to extract the scoring inputs from a user document
+def extract_user_data(user):
+    """Scoring inputs of a user read with SCORING_PROJECTION, or derived from its profile when it has no
+    scoring profile yet."""
+    if 'scoring_profile' in user:
+        return dict(user['scoring_profile'])
+    return derive_scoring_profile(user.get('profile', {}), user.get('pr_points', 0))
+
+
+# Function to re-read the profile of users saved before scoring profiles were maintained
+def complete_scoring_users(users, db):
+    users = list(users)
+    missing = [user['_id'] for user in users if 'scoring_profile' not in user]
+    if missing:
+        profiles = {user['_id']: user
+                    for user in find_documents(db['users'], {"_id": {"$in": missing}}, PROFILE_PROJECTION)}
+        users = [user if 'scoring_profile' in user else {**user, **profiles.get(user['_id'], {})} for user in users]
+    return users
 
 
 # Function to fetch user data
 def fetch_user_data(user_id, db):
     print(user_id)
     # Convert user_id to ObjectId
-    user = db['users'].find_one({"_id": ObjectId(user_id)})
+    user = find_document(db['users'], {"_id": ObjectId(user_id)}, SCORING_PROJECTION)
 
     # Check if user exists
     if user is None:
         raise ValueError(f"No user found with _id: {user_id}")
 
-    return {
-        "skills": user.get('skills', []),
-        "experience_years": sum([employment['years_in_current_role'] for employment in user.get('employment', [])]),
-        "completed_courses": [education['degree_or_course_name'] for education in user.get('education', [])],
-        "preferred_locations": user.get('preferences', {}).get('location_preference', []),
-        "pr_points": user.get('pr_points', 0)
-    }
+    return extract_user_data(complete_scoring_users([user], db)[0])
 
 
-# Function to fetch the name of courses, institutions, locations, and skills
-def fetch_name(collection, object_ids):
-    if not object_ids:
-        return []
-    results = db[collection].find({"_id": {"$in": object_ids}})
-    return [result.get('course_name' if collection == 'courses' else
-                       'institution_name' if collection == 'institutions' else
-                       'location_name' if collection == 'locations' else 'skill_name', 'Unknown')
-            for result in results]
+# Function to fetch the scoring inputs of several users with one query
+def fetch_users_data(user_ids, db):
+    users = find_documents(db['users'], {"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}},
+                           SCORING_PROJECTION)
+    return {user['_id']: extract_user_data(user) for user in complete_scoring_users(users, db)}
+
+
+# Function to fetch the scoring inputs of every prospective migrant
+def fetch_population_data(db):
+    users = find_documents(db['users'], {"user_type": "prospective_migrant"}, SCORING_PROJECTION)
+    return [extract_user_data(user) for user in complete_scoring_users(users, db)]
 
 
 # Function to fetch algorithm parameters
-def fetch_algorithm_parameters(db):
-    parameters = db["algorithm_parameters"].find_one({"_id": "default"})
-    if parameters:
-        return parameters
-    else:
-        # Default values if no parameters are set
-        return {
-            "skill_weight": 0.25,
-            "experience_weight": 0.2,
-            "course_completion_weight": 0.15,
-            "location_weight": 0.1,
-            "pr_points_weight": 0.1,
-            "success_rate_weight": 0.1,
-            "difficulty_weight": 0.05,
-            "cost_weight": 0.05,
-            "duration_weight": 0.05
-        }
+def fetch_algorithm_parameters(db, variant=DEFAULT_VARIANT):
+    return get_algorithm_parameters(db, variant=variant)
 
 
 # Function to check if the user has completed recommended courses
@@ -138,12 +130,6 @@ def calculate_total_score(skill_match, experience_match, location_match, pr_poin
     return total_score
 
 
-# Function to fetch PR pathways
-def fetch_pr_pathways(db):
-    pathways = db['pr_pathways'].find()
-    return list(pathways)
-
-
 def calculate_skill_match(user_skills, pathway_skills):
     """Calculate how well the user's skills match the pathway's required skills."""
     matching_skills = set(user_skills).intersection(set(pathway_skills))
@@ -172,80 +158,78 @@ def calculate_pr_points_match(user_points, pr_points_threshold):
     return (min(user_points, pr_points_threshold) / pr_points_threshold) * 100
 
 
-def rank_and_categorize_pathways(user_data, pathways, algorithm_parameters):
-    """Rank and categorize pathways into fully qualified, partially qualified, and potential interest categories."""
-    recommendations = {
-        "fully_qualified": [],
-        "partially_qualified": [],
-        "potential_interest": []
+def build_pathway_info(record, total_score):
+    """Collect the display data for a scored pathway."""
+    return {
+        "pathway_id": record.pathway_id,
+        "pathway_name": record.pathway_name,
+        "score": float(total_score),
+        "cost": record.cost,
+        "duration": record.duration,
+        "success_rate": record.success_rate,
+        "difficulty_level": record.difficulty_level,
+        "required_skills": record.required_skills,
+        "required_experience_years": record.required_experience_years,
+        "pr_points_threshold": record.pr_points_threshold,
+        "recommended_courses": record.recommended_courses,
+        "locations": record.locations
     }
 
-    for pathway in pathways:
-        # Calculate match scores for skills, experience, location, and PR points
-        skill_match = calculate_skill_match(user_data['skills'], pathway['required_skills'])
-        experience_match = calculate_experience_match(user_data['experience_years'],
-                                                      pathway['required_experience_years'])
-        location_match = calculate_location_match(user_data['preferred_locations'], pathway['preferred_locations'])
-        pr_points_match = calculate_pr_points_match(user_data['pr_points'], pathway['pr_points_threshold'])
-
-        # Check if the user has completed recommended courses for this pathway
-        pathway_courses = pathway['recommended_courses']  # Course IDs or names
-        course_completion = calculate_course_completion(user_data['completed_courses'], pathway_courses)
-
-        # Fetch names of required entities (skills, courses, locations)
-        skill_names = fetch_name('skills', pathway['required_skills'])
-        course_names = fetch_name('courses', pathway['recommended_courses'])
-        location_names = fetch_name('locations', pathway.get('preferred_locations', []))
-
-        # Use the new fields for difficulty, success rate, cost, and duration
-        success_rate = pathway.get('success_rate', 0)
-        difficulty_level = pathway.get('difficulty_level', 10)
-        cost = pathway.get('estimated_cost', 100000)  # Default high cost
-        duration = pathway.get('estimated_duration', 60)  # Default long duration
-
-        # Calculate total score for the pathway
-        total_score = calculate_total_score(skill_match, experience_match, location_match, pr_points_match,
-                                            course_completion, difficulty_level, success_rate, cost, duration,
-                                            algorithm_parameters)
-
-        # Collect all the data for each pathway
-        pathway_info = {
-            "pathway_id": str(pathway['_id']),  # Convert ObjectId to string
-            "pathway_name": pathway['pathway_name'],
-            "score": total_score,
-            "cost": cost,
-            "duration": duration,
-            "success_rate": success_rate,
-            "difficulty_level": difficulty_level,
-            "required_skills": skill_names,
-            "required_experience_years": pathway['required_experience_years'],
-            "pr_points_threshold": pathway['pr_points_threshold'],
-            "recommended_courses": course_names,
-            "locations": location_names
-        }
-
-        # Categorize based on total score
-        if total_score >= 80:
-            recommendations['fully_qualified'].append(pathway_info)
-        elif total_score >= 40:
-            recommendations['partially_qualified'].append(pathway_info)
-        else:
-            recommendations['potential_interest'].append(pathway_info)
 
-    return recommendations
+def categorize_pathways(catalog, scores, top_k=None, rows=None):
+    """Build the display data of the best scored pathways, grouped by category.
+
+    When only some catalog rows were scored, rows maps each score back to its pathway.
+    """
+    return {
+        category: [build_pathway_info(catalog.records[i if rows is None else rows[i]], scores[i]) for i in positions]
+        for category, positions in categorize_scores(scores, top_k).items()
+    }
+
+
+def rank_and_categorize_pathways(user_data, pathways, algorithm_parameters, db=None, top_k=None):
+    """Rank and categorize pathways into fully qualified, partially qualified, and potential interest categories.
+
+    Each category is sorted by descending score and holds at most top_k pathways when top_k is given.
+    """
+    # Compile the catalog into arrays unless the caller already did
+    if isinstance(pathways, PathwayCatalog):
+        catalog = pathways
+    else:
+        catalog = PathwayCatalog(pathways, load_vocabularies(db if db is not None else get_db()))
+
+    # Pathways outside the user's cost and duration limits are dropped before scoring
+    rows = catalog.allowed_rows(user_data)
 
+    # Score every remaining pathway in one pass
+    scores = score_pathways(user_data, catalog, algorithm_parameters, rows)
 
-def recommend_pr_pathways(user, db):
+    return categorize_pathways(catalog, scores, top_k, rows)
+
+
+def recommend_pr_pathways(user, db, top_k=None, variant=DEFAULT_VARIANT):
     """Main recommendation function."""
-    # Fetch user and pathway data
-    print("Fetching user data...")
-    user_data = fetch_user_data(user["_id"], db)
-    pathways = fetch_pr_pathways(db)
-    print("Fetching algorithm parameters...")
-    algorithm_parameters = fetch_algorithm_parameters(db)
+    # Fetch user, pathway and parameter data at the same time
+    print("Fetching user data, pathways and algorithm parameters...")
+    user_data, catalog, algorithm_parameters = fetch_concurrently(
+        lambda: fetch_user_data(user["_id"], db),
+        lambda: get_catalog(db),
+        lambda: fetch_algorithm_parameters(db, variant)
+    )
+
+    # Identical profiles scored against the same catalog and weights share one cached result
+    cache_key = profile_fingerprint(user_data, catalog.version,
+                                    (variant, algorithm_parameters.get("version"),
+                                     algorithm_parameters.get("updated_at")),
+                                    top_k)
+    recommendations = recommendation_cache.get(cache_key)
+    if recommendations is not None:
+        print("Recommendations served from cache")
+        return recommendations
 
     print("Calculating pathway recommendations...")
-    recommendations = rank_and_categorize_pathways(user_data, pathways, algorithm_parameters)
+    recommendations = rank_and_categorize_pathways(user_data, catalog, algorithm_parameters, db, top_k)
+    recommendation_cache.put(cache_key, recommendations)
     print("Recommendations calculated successfully!")
 
     print(recommendations)
@@ -253,6 +237,35 @@ def recommend_pr_pathways(user, db):
     return recommendations
 
 
+def recommend_pr_pathways_batch(user_ids, db, top_k=None):
+    """Recommend pathways for several users, keyed by user id. Unknown user ids are left out.
+
+    Each user is scored with the parameter variant they are served on their dashboard.
+    """
+    # Load the catalog, variant shares and every requested profile once, at the same time
+    users_data, catalog, shares = fetch_concurrently(
+        lambda: fetch_users_data(user_ids, db),
+        lambda: get_catalog(db),
+        lambda: get_variant_shares(db)
+    )
+
+    # Users sharing a variant and cost and duration limits are scored against the same pathways in one pass
+    groups = {}
+    for user_id, user_data in users_data.items():
+        key = (assign_variant(user_id, shares), user_data['cost_limit'], user_data['duration_limit'])
+        groups.setdefault(key, []).append(user_id)
+
+    recommendations = {}
+    for (variant, _, _), group in groups.items():
+        rows = catalog.allowed_rows(users_data[group[0]])
+        scores = score_users([users_data[user_id] for user_id in group], catalog,
+                             fetch_algorithm_parameters(db, variant), rows)
+        for user_id, user_scores in zip(group, scores):
+            recommendations[user_id] = categorize_pathways(catalog, user_scores, top_k, rows)
+
+    return {user_id: recommendations[user_id] for user_id in users_data}
+
+
 # Function to save a preferred pathway to the database
 # Function to save a preferred pathway to the database
 def save_preferred_pathway(user_id, pathway, db):
@@ -260,9 +273,6 @@ def save_preferred_pathway(user_id, pathway, db):
     if isinstance(pathway, pd.Series):
         pathway = pathway.to_dict()
 
-    # Check if the user already has saved recommendations
-    existing_record = db["saved_recommendations"].find_one({"user_id": ObjectId(user_id)})
-
     # Pathway details to be saved
     saved_recommendation = {
         "pathway_id": ObjectId(pathway['pathway_id']),
@@ -272,30 +282,36 @@ def save_preferred_pathway(user_id, pathway, db):
 
     print(saved_recommendation)
 
-    # If the user has saved recommendations, append the new one
-    if existing_record:
-        print("Existing record found...")
-        db["saved_recommendations"].update_one(
-            {"user_id": ObjectId(user_id)},
-            {"$push": {"saved_recommendations": saved_recommendation}}
-        )
-    else:
-        print("No existing record found...")
-        # If no record exists for this user, create a new one
-        db["saved_recommendations"].insert_one({
-            "user_id": ObjectId(user_id),
-            "saved_recommendations": [saved_recommendation]
-        })
+    # Append the new one, creating the user's record on their first save
+    db["saved_recommendations"].update_one(
+        {"user_id": ObjectId(user_id)},
+        {"$push": {"saved_recommendations": saved_recommendation}},
+        upsert=True
+    )
+
+    # Keep the saved pathways of this session in step without reading them back
+    memo = st.session_state.get("saved_pathways_memo")
+    if memo is not None and memo["user_id"] == ObjectId(user_id):
+        memo["saved_pathways"].append(saved_recommendation)
 
     return "Recommendation saved successfully!"
 
 
 # Function to fetch saved recommendations
 def fetch_saved_recommendations(user_id, db):
-    saved = db["saved_recommendations"].find_one({"user_id": ObjectId(user_id)})
+    saved = find_document(db["saved_recommendations"], {"user_id": ObjectId(user_id)}, {"saved_recommendations": 1})
     return saved["saved_recommendations"] if saved else []
 
 
+# Function to fetch saved recommendations once per session, later saves and removals update the copy in place
+def get_session_saved_recommendations(user_id, db):
+    memo = st.session_state.get("saved_pathways_memo")
+    if memo is None or memo["user_id"] != ObjectId(user_id):
+        memo = {"user_id": ObjectId(user_id), "saved_pathways": fetch_saved_recommendations(user_id, db)}
+        st.session_state.saved_pathways_memo = memo
+    return memo["saved_pathways"]
+
+
 # Function to show recommendations with a save button
 def show_recommendations(recommendations, user, db, rec_saved):
     """Display recommendations in a user-friendly format using Streamlit."""
@@ -332,7 +348,7 @@ def show_recommendations(recommendations, user, db, rec_saved):
                     if st.button(f"Save {path['pathway_name']}", key=f"save_{path['pathway_id']}"):
                         save_message = save_preferred_pathway(user["_id"], path, db)
                         st.success(save_message)
-                        st.rerun()  # Refresh the page to show the saved recommendation
+                        st.rerun(scope="fragment")  # Refresh the dashboard's pathways to show the saved recommendation
         else:
             st.write(f"No {category.lower()} pathways found.")
 
@@ -344,6 +360,13 @@ def remove_saved_pathway(user_id, pathway_id, db):
         {"user_id": ObjectId(user_id)},
         {"$pull": {"saved_recommendations": {"pathway_id": ObjectId(pathway_id)}}}
     )
+
+    # Keep the saved pathways of this session in step without reading them back
+    memo = st.session_state.get("saved_pathways_memo")
+    if memo is not None and memo["user_id"] == ObjectId(user_id):
+        memo["saved_pathways"] = [path for path in memo["saved_pathways"]
+                                  if path["pathway_id"] != ObjectId(pathway_id)]
+
     return "Recommendation removed successfully!"
 
 hide_table_row_index = """
@@ -359,8 +382,8 @@ hide_table_row_index = """
 def show_saved_recommendations(user, db):
     st.subheader("Saved Pathways")
 
-    # Fetch saved recommendations from the database
-    saved_paths = fetch_saved_recommendations(user["_id"], db)
+    # Fetch saved recommendations from the database, once per session
+    saved_paths = get_session_saved_recommendations(user["_id"], db)
 
     if saved_paths:
         # Prepare the DataFrame for displaying saved recommendations
@@ -385,7 +408,16 @@ def show_saved_recommendations(user, db):
             if st.button(f"Remove {path['pathway_name']}", key=f"remove_{path['pathway_id']}"):
                 remove_message = remove_saved_pathway(user["_id"], path['pathway_id'], db)
                 st.success(remove_message)
-                st.rerun()  # Refresh the page to reflect the removal
+                st.rerun(scope="fragment")  # Refresh the dashboard's pathways to reflect the removal
+
+        # Pathways resembling the saved ones, read from the precomputed neighbor table
+        similar_paths = fetch_similar_pathways([path['pathway_id'] for path in saved_paths], db)
+        if similar_paths:
+            st.subheader("Similar Pathways")
+            st.table(pd.DataFrame([{
+                "pathway_name": path['pathway_name'],
+                "similarity": round(path['similarity'] * 100, 1)
+            } for path in similar_paths]))
 
         return saved_df
     else:
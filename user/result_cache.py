@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """Bounded LRU cache of recommendation results, shared by every session of the process.
+
+    Cached results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        # Approximate the memory held by a result with its pickled size
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size_bytes += size
+
+            # Evict the least recently used results until both limits hold
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# Process-wide cache of recommend_pr_pathways results
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+
+# Function to build a stable cache key from the scoring inputs of a profile
+def profile_fingerprint(user_data, catalog_version, parameters_version, top_k=None):
+    """Hash the scoring-relevant profile fields with the catalog and parameter versions.
+
+    The user id is deliberately left out so identical profiles share one entry.
+    """
+    fingerprint = {
+        "skills": sorted(map(str, user_data['skills'])),
+        "experience_years": user_data['experience_years'],
+        "completed_courses": sorted(map(str, user_data['completed_courses'])),
+        "preferred_locations": sorted(map(str, user_data['preferred_locations'])),
+        "pr_points": user_data['pr_points'],
+        "cost_limit": user_data.get('cost_limit', 0),
+        "duration_limit": user_data.get('duration_limit', 0),
+        "catalog_version": catalog_version,
+        "parameters_version": parameters_version,
+        "top_k": top_k
+    }
+    encoded = json.dumps(fingerprint, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
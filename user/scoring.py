@@ -0,0 +1,528 @@
+import hashlib
+
+import numpy as np
+
+from user.vocabulary import Vocabulary
+
+# Recommendation categories in display order
+CATEGORIES = ("fully_qualified", "partially_qualified", "potential_interest")
+
+# Algorithm parameter keys, in the order of the score components
+WEIGHT_KEYS = (
+    "skill_weight",
+    "experience_weight",
+    "course_completion_weight",
+    "location_weight",
+    "pr_points_weight",
+    "success_rate_weight",
+    "difficulty_weight",
+    "cost_weight",
+    "duration_weight"
+)
+
+# Score thresholds for the fully and partially qualified categories
+FULLY_QUALIFIED_SCORE = 80
+PARTIALLY_QUALIFIED_SCORE = 40
+
+# Upper bounds used to normalize cost and duration to a percentage
+MAX_COST = 50000
+MAX_DURATION = 60
+
+
+# Numeric pathway fields as (catalog attribute, document field, default when missing)
+NUMERIC_FIELDS = (
+    ("experience_years", "required_experience_years", None),
+    ("pr_points_threshold", "pr_points_threshold", None),
+    ("success_rate", "success_rate", 0),
+    ("difficulty_level", "difficulty_level", 10),
+    ("cost", "estimated_cost", 100000),  # Default high cost
+    ("duration", "estimated_duration", 60)  # Default long duration
+)
+
+
+def numeric_value(pathway, field, default):
+    return pathway[field] if default is None else pathway.get(field, default)
+
+
+class ItemIndex:
+    """Pathway bitsets over a skill, course or location vocabulary, with an inverted index from item id to rows."""
+
+    def __init__(self, item_lists, vocabulary=None):
+        self.vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        self.postings = {}
+        rows, cols, counts = [], [], []
+        for row, items in enumerate(item_lists):
+            # Items aliasing the same entity set one bit, so they count once
+            item_ids = {self._intern(item) for item in items}
+            for item_id in item_ids:
+                rows.append(row)
+                cols.append(item_id)
+                self.postings[item_id].add(row)
+            counts.append(len(item_ids))
+
+        self.incidence = np.zeros((len(item_lists), self.vocabulary.size), dtype=bool)
+        self.incidence[rows, cols] = True
+        self.counts = np.array(counts, dtype=float)
+
+    def _intern(self, item):
+        item_id = self.vocabulary.intern(item)
+        self.postings.setdefault(item_id, set())
+        return item_id
+
+    def set_row(self, row, items):
+        """Replace the items of an existing row, or append the row when it is one past the end."""
+        if row == len(self.counts):
+            self.incidence = np.vstack([self.incidence, np.zeros((1, self.incidence.shape[1]), dtype=bool)])
+            self.counts = np.append(self.counts, 0.0)
+
+        for item_id in np.flatnonzero(self.incidence[row]):
+            self.incidence[row, item_id] = False
+            self.postings[item_id].discard(row)
+
+        item_ids = list({self._intern(item) for item in items})
+        if self.vocabulary.size > self.incidence.shape[1]:
+            self.incidence = np.hstack([
+                self.incidence,
+                np.zeros((self.incidence.shape[0], self.vocabulary.size - self.incidence.shape[1]), dtype=bool)
+            ])
+        self.incidence[row, item_ids] = True
+        self.counts[row] = len(item_ids)
+        for item_id in item_ids:
+            self.postings[item_id].add(row)
+
+    def copy(self, vocabulary):
+        """Independent copy over the given copy of this index's vocabulary."""
+        index = ItemIndex([], vocabulary)
+        index.postings = {item_id: set(rows) for item_id, rows in self.postings.items()}
+        index.incidence = self.incidence.copy()
+        index.counts = self.counts.copy()
+        return index
+
+    def item_ids(self, items):
+        """Interned ids of the given names or ObjectIds that some pathway references."""
+        return {item_id for item_id in self.vocabulary.lookup(items) if item_id in self.postings}
+
+    def candidates(self, items):
+        """Rows of the pathways sharing at least one of the given items."""
+        rows = set()
+        for item_id in self.item_ids(items):
+            rows.update(self.postings[item_id])
+        return rows
+
+
+class NumericIndex:
+    """Pathway rows sorted by one numeric attribute, so range queries are a binary search."""
+
+    def __init__(self, values):
+        self.order = np.argsort(values, kind="stable")
+        self.values = values[self.order]
+
+    def at_most(self, limit):
+        """Rows whose value is at most limit, in catalog order."""
+        return np.sort(self.order[:np.searchsorted(self.values, limit, side="right")])
+
+
+class PathwayRecord:
+    """Display fields of a pathway, with skill, course and location names already resolved."""
+
+    __slots__ = ("pathway_id", "pathway_name", "cost", "duration", "success_rate", "difficulty_level",
+                 "required_skills", "required_experience_years", "pr_points_threshold", "recommended_courses",
+                 "locations")
+
+    def __init__(self, pathway, vocabularies):
+        self.pathway_id = str(pathway['_id'])  # Convert ObjectId to string
+        self.pathway_name = pathway['pathway_name']
+        self.cost = pathway.get('estimated_cost', 100000)  # Default high cost
+        self.duration = pathway.get('estimated_duration', 60)  # Default long duration
+        self.success_rate = pathway.get('success_rate', 0)
+        self.difficulty_level = pathway.get('difficulty_level', 10)
+        self.required_skills = vocabularies['skills'].display_names(pathway['required_skills'])
+        self.required_experience_years = pathway['required_experience_years']
+        self.pr_points_threshold = pathway['pr_points_threshold']
+        self.recommended_courses = vocabularies['courses'].display_names(pathway['recommended_courses'])
+        self.locations = vocabularies['locations'].display_names(pathway.get('preferred_locations', []))
+
+
+class PathwayCatalog:
+    """PR pathways compiled into dense arrays so a user can be scored against all of them at once."""
+
+    def __init__(self, pathways, vocabularies=None, version=None):
+        pathways = list(pathways)
+        self.version = version
+        self.rows = {pathway['_id']: row for row, pathway in enumerate(pathways)}
+
+        # Without shared vocabularies, items only match when profiles use the same keys as pathways
+        self.vocabularies = vocabularies or {key: Vocabulary() for key in ('skills', 'courses', 'locations')}
+        self.skills = ItemIndex([pathway['required_skills'] for pathway in pathways],
+                                self.vocabularies['skills'])
+        self.courses = ItemIndex([pathway['recommended_courses'] for pathway in pathways],
+                                 self.vocabularies['courses'])
+        self.locations = ItemIndex([pathway.get('preferred_locations', []) for pathway in pathways],
+                                   self.vocabularies['locations'])
+
+        for attribute, field, default in NUMERIC_FIELDS:
+            setattr(self, attribute, np.array(
+                [numeric_value(pathway, field, default) for pathway in pathways], dtype=float))
+
+        self.records = [PathwayRecord(pathway, self.vocabularies) for pathway in pathways]
+        self._layout = None
+        self._numeric_indexes = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def layout(self):
+        """Digest of the pathway ids in row order, telling whether stored rows still point at the same pathways."""
+        if self._layout is None:
+            ids = sorted(self.rows, key=self.rows.get)
+            self._layout = hashlib.sha1("\n".join(str(pathway_id) for pathway_id in ids).encode()).hexdigest()
+        return self._layout
+
+    def copy(self, version=None):
+        """Independent copy stamped with version, which can be upserted into while this catalog is served."""
+        catalog = PathwayCatalog([], version=version)
+        catalog.rows = dict(self.rows)
+        catalog.vocabularies = {kind: vocabulary.copy() for kind, vocabulary in self.vocabularies.items()}
+        catalog.skills = self.skills.copy(catalog.vocabularies['skills'])
+        catalog.courses = self.courses.copy(catalog.vocabularies['courses'])
+        catalog.locations = self.locations.copy(catalog.vocabularies['locations'])
+        for attribute, _, _ in NUMERIC_FIELDS:
+            setattr(catalog, attribute, getattr(self, attribute).copy())
+        catalog.records = list(self.records)
+        catalog._layout = self._layout
+        return catalog
+
+    def resolves(self, pathway):
+        """Whether the vocabularies already know every skill, course and location of a pathway."""
+        return all(item in self.vocabularies[kind].ids
+                   for kind, items in (("skills", pathway['required_skills']),
+                                       ("courses", pathway['recommended_courses']),
+                                       ("locations", pathway.get('preferred_locations', [])))
+                   for item in items)
+
+    def upsert(self, pathway):
+        """Insert a new pathway or update an existing one in place, without recompiling the catalog."""
+        row = self.rows.get(pathway['_id'], len(self.records))
+        record = PathwayRecord(pathway, self.vocabularies)
+        if row == len(self.records):
+            self.records.append(record)
+            self.rows[pathway['_id']] = row
+            self._layout = None
+            for attribute, _, _ in NUMERIC_FIELDS:
+                setattr(self, attribute, np.append(getattr(self, attribute), 0.0))
+        else:
+            self.records[row] = record
+
+        self.skills.set_row(row, pathway['required_skills'])
+        self.courses.set_row(row, pathway['recommended_courses'])
+        self.locations.set_row(row, pathway.get('preferred_locations', []))
+        for attribute, field, default in NUMERIC_FIELDS:
+            getattr(self, attribute)[row] = numeric_value(pathway, field, default)
+        self._numeric_indexes.clear()
+
+    def numeric_index(self, attribute):
+        """Sorted index over a numeric attribute, built on first use."""
+        if attribute not in self._numeric_indexes:
+            self._numeric_indexes[attribute] = NumericIndex(getattr(self, attribute))
+        return self._numeric_indexes[attribute]
+
+    def allowed_rows(self, user_data):
+        """Rows of the pathways within the user's cost and duration limits, or None when no limit is set.
+
+        A limit of 0 means no limit, as in the profile form.
+        """
+        rows = None
+        for attribute, limit in (("cost", user_data.get('cost_limit', 0)),
+                                 ("duration", user_data.get('duration_limit', 0))):
+            if limit:
+                within = self.numeric_index(attribute).at_most(limit)
+                rows = within if rows is None else np.intersect1d(rows, within, assume_unique=True)
+        return rows
+
+    def candidate_rows(self, users_data):
+        """Rows of the pathways sharing a skill, course or location with at least one of the users."""
+        rows = set()
+        for user_data in users_data:
+            rows |= self.skills.candidates(user_data['skills'])
+            rows |= self.courses.candidates(user_data['completed_courses'])
+            rows |= self.locations.candidates(user_data['preferred_locations'])
+        return np.array(sorted(rows), dtype=int)
+
+
+def match_percentages(index, user_item_lists, rows):
+    """Percentage of each given pathway row's items that appear in each user's items, as a users x rows matrix.
+
+    Each user's items become a bitset over the vocabulary, so the overlap with a pathway is the popcount of the
+    AND of both bitsets, computed for all users at once as a product over the columns any user holds.
+    """
+    user_ids = [index.item_ids(items) for items in user_item_lists]
+    columns = sorted(set().union(*user_ids))
+    positions = {column: position for position, column in enumerate(columns)}
+
+    users = np.zeros((len(user_item_lists), len(columns)), dtype=np.float32)
+    for row, item_ids in enumerate(user_ids):
+        users[row, [positions[item_id] for item_id in item_ids]] = 1
+
+    matched = users @ index.incidence[np.ix_(rows, columns)].T.astype(np.float32)
+    counts = index.counts[rows]
+    return np.divide(matched * 100, counts, out=np.zeros(matched.shape), where=counts > 0)
+
+
+def threshold_matches(user_values, required):
+    """Percentage of each pathway's requirement covered by each user's value, 100 when nothing is required."""
+    covered = np.minimum(np.asarray(user_values, dtype=float)[:, None], required) * 100
+    return np.divide(covered, required, out=np.full(covered.shape, 100.0), where=required != 0)
+
+
+def score_users(users_data, catalog, algorithm_parameters, rows=None):
+    """Calculate the total score of every pathway in the catalog for every user, as a users x pathways matrix.
+
+    When sorted catalog rows are given, only those pathways are scored and the columns follow rows.
+    """
+    weights = dict(zip(WEIGHT_KEYS, (algorithm_parameters[key] for key in WEIGHT_KEYS)))
+
+    def take(values):
+        return values if rows is None else values[rows]
+
+    # Terms every pathway gets whatever it shares with the user, in closed form
+    total_score = (
+            threshold_matches([user_data['experience_years'] for user_data in users_data],
+                              take(catalog.experience_years)) * weights["experience_weight"] +
+            threshold_matches([user_data['pr_points'] for user_data in users_data],
+                              take(catalog.pr_points_threshold)) * weights["pr_points_weight"] +
+            take(catalog.success_rate) * weights["success_rate_weight"] +
+            (100 - take(catalog.difficulty_level)) * weights["difficulty_weight"] +
+            (100 - take(catalog.cost) / MAX_COST * 100) * weights["cost_weight"] +
+            (100 - take(catalog.duration) / MAX_DURATION * 100) * weights["duration_weight"]
+    )
+
+    # Skill, course and location terms are only non-zero for pathways found through the inverted index
+    candidates = catalog.candidate_rows(users_data)
+    columns = candidates
+    if rows is not None:
+        candidates = candidates[np.isin(candidates, rows, assume_unique=True)]
+        columns = np.searchsorted(rows, candidates)
+    if len(candidates):
+        total_score[:, columns] += (
+                match_percentages(catalog.skills, [user_data['skills'] for user_data in users_data],
+                                  candidates) * weights["skill_weight"] +
+                match_percentages(catalog.courses, [user_data['completed_courses'] for user_data in users_data],
+                                  candidates) * weights["course_completion_weight"] +
+                match_percentages(catalog.locations, [user_data['preferred_locations'] for user_data in users_data],
+                                  candidates) * weights["location_weight"]
+        )
+
+    # Ensure the score is between 0 and 100
+    return np.clip(total_score, 0, 100)
+
+
+def score_pathways(user_data, catalog, algorithm_parameters, rows=None):
+    """Calculate the total score of every pathway in the catalog, or of the given rows, for one user."""
+    return score_users([user_data], catalog, algorithm_parameters, rows)[0]
+
+
+def select_top_k(scores, positions, top_k=None):
+    """Order positions by descending score, keeping only the best top_k when given."""
+    if top_k is not None and top_k < len(positions):
+        if top_k <= 0:
+            return positions[:0]
+        # Partial selection finds the k-th best score in linear time. Every position tied with it is kept, so the
+        # trim below picks among them by catalog order like a full stable sort would
+        kth_score = -np.partition(-scores[positions], top_k - 1)[top_k - 1]
+        positions = positions[scores[positions] >= kth_score]
+    # Highest score first, catalog order among equal scores
+    return positions[np.lexsort((positions, -scores[positions]))][:top_k]
+
+
+def categorize_scores(scores, top_k=None):
+    """Split pathway positions into the three recommendation categories, best score first."""
+    fully_qualified = scores >= FULLY_QUALIFIED_SCORE
+    partially_qualified = ~fully_qualified & (scores >= PARTIALLY_QUALIFIED_SCORE)
+    potential_interest = ~fully_qualified & ~partially_qualified
+    return {
+        "fully_qualified": select_top_k(scores, np.flatnonzero(fully_qualified), top_k),
+        "partially_qualified": select_top_k(scores, np.flatnonzero(partially_qualified), top_k),
+        "potential_interest": select_top_k(scores, np.flatnonzero(potential_interest), top_k)
+    }
+
+
+def category_indices(scores):
+    """Position in CATEGORIES of the category each score falls into."""
+    return np.where(scores >= FULLY_QUALIFIED_SCORE, 0, np.where(scores >= PARTIALLY_QUALIFIED_SCORE, 1, 2))
+
+
+def weight_matrix(parameter_sets):
+    """Weights of several algorithm parameter sets as a variants x components matrix, in WEIGHT_KEYS order."""
+    return np.array([[algorithm_parameters[key] for key in WEIGHT_KEYS] for algorithm_parameters in parameter_sets],
+                    dtype=float)
+
+
+def item_pairs(users_data, catalog, chunk_size=1000):
+    """Skill, course and location match percentages of every user and pathway pair sharing at least one item.
+
+    Returns the user positions, pathway rows and a pairs x 3 float32 matrix of components, ordered by user.
+    """
+    pair_users, pair_pathways, pair_components = [], [], []
+    for start in range(0, len(users_data), chunk_size):
+        chunk = users_data[start:start + chunk_size]
+        candidates = catalog.candidate_rows(chunk)
+        if not len(candidates):
+            continue
+
+        skill_match = match_percentages(catalog.skills, [user_data['skills'] for user_data in chunk], candidates)
+        course_match = match_percentages(catalog.courses, [user_data['completed_courses'] for user_data in chunk],
+                                         candidates)
+        location_match = match_percentages(catalog.locations,
+                                           [user_data['preferred_locations'] for user_data in chunk], candidates)
+        users, columns = np.nonzero((skill_match > 0) | (course_match > 0) | (location_match > 0))
+        pair_users.append((users + start).astype(np.int32))
+        pair_pathways.append(candidates[columns].astype(np.int32))
+        pair_components.append(np.stack([skill_match[users, columns], course_match[users, columns],
+                                         location_match[users, columns]], axis=1).astype(np.float32))
+
+    if not pair_users:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros((0, 3), dtype=np.float32)
+    return np.concatenate(pair_users), np.concatenate(pair_pathways), np.concatenate(pair_components)
+
+
+class WeightSimulation:
+    """Scores of a whole population kept in factored form, so any candidate weights rescore it in a few operations.
+
+    Users with the same experience and PR points share one dense row of components, and skill, course and
+    location matches are only stored for the user and pathway pairs that share an item. Those pairs can be passed
+    in when they were stored earlier, in which case users_data only needs experience years and PR points.
+    """
+
+    def __init__(self, users_data, catalog, pairs=None, chunk_size=1000):
+        self.size = len(users_data)
+        self.pathway_count = len(catalog)
+
+        # Group users by the inputs of the dense components
+        group_keys = {}
+        representatives = []
+        groups = []
+        for user_data in users_data:
+            key = (user_data['experience_years'], user_data['pr_points'])
+            if key not in group_keys:
+                group_keys[key] = len(group_keys)
+                representatives.append(user_data)
+            groups.append(group_keys[key])
+        self.groups = np.array(groups, dtype=np.int64)
+        self.group_sizes = np.bincount(self.groups, minlength=len(representatives))
+
+        # Experience and PR points components per group, as 2 x groups x pathways
+        self.group_components = np.stack([
+            threshold_matches([user_data['experience_years'] for user_data in representatives],
+                              catalog.experience_years),
+            threshold_matches([user_data['pr_points'] for user_data in representatives],
+                              catalog.pr_points_threshold)
+        ]) if representatives else np.zeros((2, 0, len(catalog)))
+
+        # Success, difficulty, cost and duration components, as 4 x pathways
+        self.pathway_components = np.stack([
+            catalog.success_rate,
+            100 - catalog.difficulty_level,
+            100 - catalog.cost / MAX_COST * 100,
+            100 - catalog.duration / MAX_DURATION * 100
+        ])
+
+        # Skill, course and location components of the pairs sharing an item, ordered by user
+        if pairs is None:
+            pairs = item_pairs(users_data, catalog, chunk_size)
+        self.pair_users, self.pair_pathways, self.pair_components = pairs
+        self.paired_users, self.pair_starts = np.unique(self.pair_users, return_index=True)
+
+    def _dense_scores(self, weights):
+        """Unclipped scores of each group of users against every pathway, before the item components.
+
+        Weights are one row of weight_matrix, giving groups x pathways, or the whole matrix, giving
+        variants x groups x pathways.
+        """
+        return (self.group_components[0] * weights[..., 1, None, None] +
+                self.group_components[1] * weights[..., 4, None, None] +
+                (weights[..., 5:] @ self.pathway_components)[..., None, :])
+
+    def user_scores(self, algorithm_parameters):
+        """Yield the score of every pathway for each user in turn, as score_users would compute it."""
+        weights = weight_matrix([algorithm_parameters])[0]
+        dense = self._dense_scores(weights)
+        pair_scores = self.pair_components @ weights[[0, 2, 3]]
+        bounds = np.searchsorted(self.pair_users, np.arange(self.size + 1))
+
+        for user, group in enumerate(self.groups):
+            scores = dense[group].copy()
+            pairs = slice(bounds[user], bounds[user + 1])
+            scores[self.pair_pathways[pairs]] += pair_scores[pairs]
+            yield np.clip(scores, 0, 100)
+
+    def rescore(self, algorithm_parameters):
+        """Category counts of all user and pathway pairs, plus each user's best score and its category."""
+        weights = weight_matrix([algorithm_parameters])[0]
+
+        dense = self._dense_scores(weights)
+        dense_scores = np.clip(dense, 0, 100)
+        pair_dense_scores = dense_scores[self.groups[self.pair_users], self.pair_pathways]
+        pair_scores = np.clip(dense[self.groups[self.pair_users], self.pair_pathways] +
+                              self.pair_components @ weights[[0, 2, 3]], 0, 100)
+
+        # Every pair starts in its group's dense category, then pairs sharing an item are corrected
+        dense_categories = category_indices(dense_scores)
+        group_counts = np.stack([(dense_categories == category).sum(axis=1) for category in range(3)], axis=1)
+        pair_counts = self.group_sizes @ group_counts
+        pair_counts -= np.bincount(category_indices(pair_dense_scores), minlength=3)
+        pair_counts += np.bincount(category_indices(pair_scores), minlength=3)
+
+        top_scores = np.zeros(self.size)
+        if self.pathway_count:
+            top_scores = dense_scores.max(axis=1)[self.groups]
+        if len(pair_scores):
+            top_scores[self.paired_users] = np.maximum(top_scores[self.paired_users],
+                                                       np.maximum.reduceat(pair_scores, self.pair_starts))
+
+        return {
+            "pair_counts": dict(zip(CATEGORIES, pair_counts.tolist())),
+            "top_scores": top_scores,
+            "user_categories": category_indices(top_scores)
+        }
+
+    def compare_variants(self, parameter_sets, top_k=10, max_cells=4000000):
+        """Score every parameter set at once, treating their weights as one matrix.
+
+        Returns, per parameter set, the category counts of all user and pathway pairs, the number of users whose
+        best pathway falls in each category, and the mean share of each user's top_k pathways that the first
+        parameter set also ranks in its top_k.
+        """
+        weights = weight_matrix(parameter_sets)
+        variants = len(weights)
+        dense = self._dense_scores(weights)
+        pair_scores = self.pair_components @ weights[:, [0, 2, 3]].T
+        bounds = np.searchsorted(self.pair_users, np.arange(self.size + 1))
+        top_k = min(top_k, self.pathway_count)
+
+        pair_counts = np.zeros((variants, 3), dtype=np.int64)
+        user_counts = np.zeros((variants, 3), dtype=np.int64)
+        overlap = np.zeros(variants)
+        # Users are scored in chunks so the variants x users x pathways block stays within max_cells
+        chunk_size = max(1, max_cells // max(1, variants * self.pathway_count))
+        for start in range(0, self.size if self.pathway_count else 0, chunk_size):
+            stop = min(start + chunk_size, self.size)
+            scores = dense[:, self.groups[start:stop]]
+            pairs = slice(bounds[start], bounds[stop])
+            scores[:, self.pair_users[pairs] - start, self.pair_pathways[pairs]] += pair_scores[pairs].T
+            np.clip(scores, 0, 100, out=scores)
+
+            categories = category_indices(scores)
+            for variant in range(variants):
+                pair_counts[variant] += np.bincount(categories[variant].ravel(), minlength=3)
+                user_counts[variant] += np.bincount(category_indices(scores[variant].max(axis=1)), minlength=3)
+
+            if top_k:
+                top = np.argpartition(-scores, top_k - 1, axis=2)[:, :, :top_k]
+                shared = (top[:, :, :, None] == top[0][None, :, None, :]).any(axis=3).sum(axis=2)
+                overlap += shared.sum(axis=1) / top_k
+
+        return [{
+            "pair_counts": dict(zip(CATEGORIES, pair_counts[variant].tolist())),
+            "user_counts": dict(zip(CATEGORIES, user_counts[variant].tolist())),
+            "top_k_overlap": overlap[variant] / self.size if self.size else 0.0
+        } for variant in range(variants)]
@@ -0,0 +1,89 @@
+import argparse
+
+from pymongo import UpdateOne
+
+from db import fetch_concurrently, find_documents, get_db
+
+# Fields of a user document a scoring profile is derived from
+PROFILE_PROJECTION = {
+    "profile.skills": 1,
+    "profile.employment": 1,
+    "profile.education": 1,
+    "profile.preferences": 1,
+    "pr_points": 1
+}
+
+
+# Function to derive the scoring inputs of a profile, keeping skills, courses and locations as the profile names them
+def derive_scoring_profile(profile, pr_points=0):
+    preferences = profile.get('preferences') or {}
+    return {
+        "skills": list(profile.get('skills') or []),
+        "experience_years": sum(employment.get('years_in_current_role', 0)
+                                for employment in profile.get('employment') or []),
+        "completed_courses": [education['degree_or_course_name'] for education in profile.get('education') or []],
+        # New accounts store an empty string until the preferences are first saved
+        "preferred_locations": list(preferences.get('location_preference') or []),
+        "pr_points": pr_points,
+        "cost_limit": preferences.get('cost_limit', 0),
+        "duration_limit": preferences.get('duration_limit', 0)
+    }
+
+
+# Function to load the ObjectIds of every skill, course and location, keyed by the name a profile stores
+def load_item_ids(db):
+    skills, courses, locations = fetch_concurrently(
+        lambda: list(find_documents(db["skills"], {}, {"skill_name": 1})),
+        lambda: list(find_documents(db["courses"], {}, {"course_name": 1})),
+        lambda: list(find_documents(db["locations"], {}, {"location_name": 1, "state": 1}))
+    )
+    # A name shared by several documents keeps its first ObjectId, the one the catalog vocabularies intern it under
+    item_ids = {"skills": {}, "courses": {}, "locations": {}}
+    for skill in skills:
+        item_ids["skills"].setdefault(skill.get("skill_name"), skill["_id"])
+    for course in courses:
+        item_ids["courses"].setdefault(course.get("course_name"), course["_id"])
+    for location in locations:
+        item_ids["locations"].setdefault(f"{location.get('location_name')} - {location.get('state')}", location["_id"])
+    return item_ids
+
+
+# Function to build the scoring_profile subdocument stored with a user
+def build_scoring_profile(profile, pr_points, item_ids):
+    """Scoring inputs of a profile, with skills, courses and locations resolved to their ObjectIds.
+
+    Pathways reference the same ObjectIds, so the recommender matches them without going through names.
+    Names that no longer belong to a skill, course or location could never match a pathway and are dropped.
+    """
+    scoring_profile = derive_scoring_profile(profile, pr_points)
+    for field, kind in (("skills", "skills"), ("completed_courses", "courses"), ("preferred_locations", "locations")):
+        scoring_profile[field] = [item_ids[kind][name] for name in scoring_profile[field] if name in item_ids[kind]]
+    return scoring_profile
+
+
+# Function to store a scoring profile on every user saved before scoring profiles were maintained
+def backfill_scoring_profiles(db, batch_size=1000):
+    """Returns the number of users given a scoring profile."""
+    item_ids = load_item_ids(db)
+    users = find_documents(db["users"], {"scoring_profile": {"$exists": False}}, PROFILE_PROJECTION)
+
+    total = 0
+    requests = []
+    for user in users:
+        scoring_profile = build_scoring_profile(user.get("profile", {}), user.get("pr_points", 0), item_ids)
+        requests.append(UpdateOne({"_id": user["_id"]}, {"$set": {"scoring_profile": scoring_profile}}))
+        if len(requests) == batch_size:
+            db["users"].bulk_write(requests, ordered=False)
+            total += len(requests)
+            requests = []
+    if requests:
+        db["users"].bulk_write(requests, ordered=False)
+        total += len(requests)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store a scoring profile on users that do not have one yet.")
+    parser.parse_args()
+
+    print(f"Scoring profiles stored for {backfill_scoring_profiles(get_db())} users.")
@@ -0,0 +1,172 @@
+import argparse
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+from pymongo import DeleteMany, ReplaceOne
+
+from db import fetch_concurrently, find_document, find_documents, get_db
+from user.catalog import get_catalog
+from user.scoring import MAX_COST, MAX_DURATION
+from user.versions import fetch_catalog_version
+
+# Number of neighbors stored per pathway
+SIMILAR_PATHWAYS_LIMIT = 10
+
+# Weight of each kind of resemblance in the similarity of two pathways
+SIMILARITY_WEIGHTS = {
+    "skills": 0.4,
+    "courses": 0.2,
+    "locations": 0.2,
+    "numeric": 0.2
+}
+
+# Document in the versions collection recording the catalog version the neighbor table was built from
+SIMILARITY_VERSION_ID = "pathway_similarity"
+
+
+# Function to scale the numeric pathway attributes to 0..1
+def numeric_features(catalog):
+    return np.clip(np.stack([
+        catalog.cost / MAX_COST,
+        catalog.duration / MAX_DURATION,
+        catalog.difficulty_level / 10,
+        catalog.success_rate / 100,
+        catalog.experience_years / max(1.0, catalog.experience_years.max(initial=0)),
+        catalog.pr_points_threshold / 100
+    ], axis=1), 0, 1)
+
+
+class ItemPostings:
+    """Rows of every item of an index, stored item after item, with each row's cosine scale for one weight."""
+
+    def __init__(self, index, weight):
+        items, self.rows = np.nonzero(index.incidence.T)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(items, minlength=index.incidence.shape[1]))])
+        self.incidence = index.incidence
+        norms = np.sqrt(index.counts)
+        self.scale = np.divide(np.sqrt(weight), norms, out=np.zeros_like(norms), where=norms > 0)
+
+    def cosine_pairs(self, rows, size):
+        """Weighted cosine contributions of the given rows with every pathway sharing an item with them, as
+        positions in a rows x size matrix and the values to add there."""
+        pair_rows, pair_items = np.nonzero(self.incidence[rows])
+        starts = self.offsets[pair_items]
+        lengths = self.offsets[pair_items + 1] - starts
+        owners = np.repeat(pair_rows, lengths)
+        others = self.rows[np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)]
+        return owners * size + others, self.scale[rows][owners] * self.scale[others]
+
+
+def pathway_neighbors(catalog, limit=SIMILAR_PATHWAYS_LIMIT, max_cells=2000000):
+    """Most similar pathways of every pathway, as rows x limit arrays of neighbor rows and similarities.
+
+    Similarity mixes the cosine of the skill, course and location sets with one minus the mean absolute
+    difference of the scaled numeric attributes. Pathways are compared in chunks of rows against the whole
+    catalog so memory stays bounded.
+    """
+    size = len(catalog)
+    limit = min(limit, size - 1)
+    if limit <= 0:
+        return np.zeros((size, 0), dtype=int), np.zeros((size, 0))
+
+    # Built once and only sliced per chunk. Item sets are sparse, so their cosines are summed through the
+    # postings of the items a row holds rather than a dense product
+    postings = [ItemPostings(index, SIMILARITY_WEIGHTS[kind]) for kind, index in
+                (("skills", catalog.skills), ("courses", catalog.courses), ("locations", catalog.locations))]
+    # Scaled by their share of the numeric weight, so a difference is directly what it takes off the similarity
+    numeric = numeric_features(catalog)
+    numeric = (numeric * (SIMILARITY_WEIGHTS["numeric"] / numeric.shape[1])).astype(np.float32)
+
+    neighbors = np.zeros((size, limit), dtype=int)
+    similarities = np.zeros((size, limit))
+    chunk_size = max(1, max_cells // size)
+    difference = np.empty((min(chunk_size, size), size), dtype=np.float32)
+    for start in range(0, size, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, size))
+        positions, values = zip(*(item_postings.cosine_pairs(rows, size) for item_postings in postings))
+        similarity = np.bincount(np.concatenate(positions), weights=np.concatenate(values),
+                                 minlength=len(rows) * size).reshape(len(rows), size).astype(np.float32)
+        similarity += SIMILARITY_WEIGHTS["numeric"]
+        # One attribute at a time, so no rows x pathways x attributes block is built
+        chunk_difference = difference[:len(rows)]
+        for column in range(numeric.shape[1]):
+            np.subtract.outer(numeric[rows, column], numeric[:, column], out=chunk_difference)
+            similarity -= np.abs(chunk_difference, out=chunk_difference)
+        # A pathway is not its own neighbor
+        similarity[np.arange(len(rows)), rows] = -np.inf
+
+        top = np.argpartition(-similarity, limit - 1, axis=1)[:, :limit]
+        top_similarity = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_similarity, axis=1, kind="stable")
+        neighbors[rows] = np.take_along_axis(top, order, axis=1)
+        similarities[rows] = np.take_along_axis(top_similarity, order, axis=1)
+
+    return neighbors, similarities
+
+
+# Function to rebuild the pathway_similarity collection when the catalog changed since it was built
+def refresh_pathway_similarity(db, force=False):
+    """Store the top neighbors of every pathway, keyed by pathway id. Returns whether the table was rebuilt."""
+    catalog = get_catalog(db)
+    built = find_document(db["versions"], {"_id": SIMILARITY_VERSION_ID}, {"catalog_version": 1}) or {}
+    if not force and built.get("catalog_version") == catalog.version:
+        return False
+
+    neighbors, similarities = pathway_neighbors(catalog)
+    pathway_ids = sorted(catalog.rows, key=catalog.rows.get)
+    updated_at = datetime.utcnow()
+    requests = [ReplaceOne({"_id": pathway_id}, {
+        "catalog_version": catalog.version,
+        "neighbors": [{
+            "pathway_id": pathway_ids[neighbor],
+            "pathway_name": catalog.records[neighbor].pathway_name,
+            "similarity": float(similarity)
+        } for neighbor, similarity in zip(neighbors[row], similarities[row])],
+        "updated_at": updated_at
+    }, upsert=True) for row, pathway_id in enumerate(pathway_ids)]
+    # Pathways removed from the catalog lose their entry
+    requests.append(DeleteMany({"catalog_version": {"$ne": catalog.version}}))
+    db["pathway_similarity"].bulk_write(requests, ordered=False)
+
+    db["versions"].update_one({"_id": SIMILARITY_VERSION_ID},
+                              {"$set": {"catalog_version": catalog.version, "updated_at": updated_at}}, upsert=True)
+    return True
+
+
+# Function to fetch the stored neighbors of several pathways with one query
+def fetch_similar_pathways(pathway_ids, db, limit=5):
+    """Neighbors of the given pathways, best first, leaving out the given pathways themselves.
+
+    Entries built from an older catalog than the current one are skipped, as their neighbors may have been
+    deleted or changed since.
+    """
+    pathway_ids = [ObjectId(pathway_id) for pathway_id in pathway_ids]
+    entries, version = fetch_concurrently(
+        lambda: list(find_documents(db["pathway_similarity"], {"_id": {"$in": pathway_ids}},
+                                    {"catalog_version": 1, "neighbors": 1})),
+        lambda: fetch_catalog_version(db)
+    )
+
+    similar = {}
+    for entry in entries:
+        if entry.get("catalog_version") != version:
+            continue
+        for neighbor in entry["neighbors"]:
+            if neighbor["pathway_id"] in pathway_ids:
+                continue
+            best = similar.get(neighbor["pathway_id"])
+            if best is None or neighbor["similarity"] > best["similarity"]:
+                similar[neighbor["pathway_id"]] = neighbor
+    return sorted(similar.values(), key=lambda neighbor: -neighbor["similarity"])[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the pathway similarity table when the catalog changed.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the catalog did not change")
+    args = parser.parse_args()
+
+    if refresh_pathway_similarity(get_db(), args.force):
+        print("Pathway similarity table rebuilt.")
+    else:
+        print("Pathway similarity table is up to date.")
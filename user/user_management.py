@@ -4,6 +4,13 @@ import bcrypt
 import streamlit as st
 from bson import ObjectId
 
+from db import find_document
+from user.scoring_profile import derive_scoring_profile
+
+
+# Fields of a user kept in the session after login. The password hash is read by the login check only
+SESSION_USER_PROJECTION = {"username": 1, "user_type": 1, "profile": 1, "pr_points": 1, "disabled": 1}
+
 
 def hash_password(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
@@ -15,28 +22,31 @@ def verify_password(stored_password, provided_password):
 
 def create_user(username, password, user_type, users_collection):
     hashed_password = hash_password(password)
+    profile = {
+        "first_name": "",
+        "last_name": "",
+        "date_of_birth": None,
+        "gender": "",
+        "location": "",
+        "nationality": "",
+        "skills": [],
+        "experience_years": 0,
+        "english_proficiency": "",
+        "preferences": {
+            "location_preference": "",
+            "study_preference": "",
+            "cost_limit": 0,
+            "duration_limit": 0
+        }
+    }
     user = {
         "_id": ObjectId(),
         "username": username,
         "password": hashed_password,
         "user_type": user_type,
-        "profile": {
-            "first_name": "",
-            "last_name": "",
-            "date_of_birth": None,
-            "gender": "",
-            "location": "",
-            "nationality": "",
-            "skills": [],
-            "experience_years": 0,
-            "english_proficiency": "",
-            "preferences": {
-                "location_preference": "",
-                "study_preference": "",
-                "cost_limit": 0,
-                "duration_limit": 0
-            }
-        },
+        "profile": profile,
+        # An empty profile has nothing to resolve, so its scoring profile needs no lookups
+        "scoring_profile": derive_scoring_profile(profile),
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
@@ -44,13 +54,13 @@ def create_user(username, password, user_type, users_collection):
 
 
 def authenticate_user(username, password, users_collection):
-    user = users_collection.find_one({"username": username})
+    user = find_document(users_collection, {"username": username}, {**SESSION_USER_PROJECTION, "password": 1})
     if user:
         # Check if the user is disabled
         if user.get('disabled', False):
             st.error("This account has been disabled. Please contact support.")
             return None
-        elif verify_password(user["password"], password):
+        elif verify_password(user.pop("password"), password):
             return user
         else:
             return None
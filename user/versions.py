@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from db import fetch_concurrently, find_document
+from user.parameters import DEFAULT_VARIANT, get_algorithm_parameters
+
+# Document in the versions collection tracking edits to the pr_pathways catalog
+CATALOG_VERSION_ID = "pr_pathways"
+
+# Catalog changes remembered, so snapshots up to this many versions behind can catch up without a full reload
+CATALOG_CHANGES_LIMIT = 20
+
+
+# Function to fetch the current version of the pr_pathways catalog
+def fetch_catalog_version(db):
+    version = find_document(db["versions"], {"_id": CATALOG_VERSION_ID}, {"version": 1})
+    return version["version"] if version else 0
+
+
+# Function to mark the pr_pathways catalog as changed
+def bump_catalog_version(db, pathway_ids=None):
+    """Bump the catalog version, recording which pathways were inserted or updated when the caller knows.
+
+    Without pathway ids, for example after a deletion, in-process snapshots are rebuilt from scratch.
+    """
+    version = db["versions"].find_one_and_update(
+        {"_id": CATALOG_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"version": 1}, upsert=True, return_document=ReturnDocument.AFTER
+    )["version"]
+    db["versions"].update_one({"_id": CATALOG_VERSION_ID}, {"$push": {"changes": {
+        "$each": [{"version": version, "pathway_ids": None if pathway_ids is None else list(pathway_ids)}],
+        "$slice": -CATALOG_CHANGES_LIMIT
+    }}})
+    return version
+
+
+# Function to fetch the pathways changed between two catalog versions
+def fetch_catalog_changes(db, since, until):
+    """Ids of the pathways inserted or updated after version since up to version until, or None when some
+    change in between was not recorded with its pathways."""
+    if since is None or not since < until <= since + CATALOG_CHANGES_LIMIT:
+        return None
+    document = find_document(db["versions"], {"_id": CATALOG_VERSION_ID}, {"changes": 1}) or {}
+    changes = {change["version"]: change["pathway_ids"] for change in document.get("changes", [])}
+
+    pathway_ids = set()
+    for version in range(since + 1, until + 1):
+        if changes.get(version) is None:
+            return None
+        pathway_ids.update(changes[version])
+    return list(pathway_ids)
+
+
+# Function to fetch the current version of the algorithm parameters
+def fetch_parameters_version(db, variant=DEFAULT_VARIANT):
+    return get_algorithm_parameters(db, variant=variant).get("version", 0)
+
+
+# Function to fetch the current version of a user's profile
+def fetch_profile_version(user_id, db):
+    user = find_document(db["users"], {"_id": user_id}, {"profile_version": 1})
+    return user.get("profile_version", 0) if user else 0
+
+
+# Function to fetch every version a user's recommendations depend on
+def fetch_recommendation_versions(user_id, db, variant=DEFAULT_VARIANT):
+    profile, catalog, parameters = fetch_concurrently(
+        lambda: fetch_profile_version(user_id, db),
+        lambda: fetch_catalog_version(db),
+        lambda: fetch_parameters_version(db, variant)
+    )
+    return {
+        "profile": profile,
+        "catalog": catalog,
+        "variant": variant,
+        "parameters": parameters
+    }
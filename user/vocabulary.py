@@ -0,0 +1,74 @@
+from db import fetch_concurrently, find_documents
+
+
+class Vocabulary:
+    """Dense integer ids for skills, courses or locations, reachable from both their names and ObjectIds."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+        self.size = 0
+
+    def copy(self):
+        vocabulary = Vocabulary()
+        vocabulary.ids = dict(self.ids)
+        vocabulary.names = dict(self.names)
+        vocabulary.size = self.size
+        return vocabulary
+
+    def intern(self, key):
+        """Return the id of a key, assigning the next free id to keys seen for the first time."""
+        if key not in self.ids:
+            self.ids[key] = self.size
+            self.size += 1
+        return self.ids[key]
+
+    def alias(self, key, entity_id):
+        """Make a key resolve to an existing id, keeping the first id a key was given."""
+        self.ids.setdefault(key, entity_id)
+
+    def lookup(self, keys):
+        """Ids of the known keys, skipping keys this vocabulary has never seen."""
+        return {self.ids[key] for key in keys if key in self.ids}
+
+    def display_names(self, keys):
+        """Display names of the given keys, skipping keys that do not belong to a known entity."""
+        return [self.names[self.ids[key]] for key in keys if key in self.ids and self.ids[key] in self.names]
+
+
+def build_vocabulary(entities):
+    """Intern (ObjectId, display name, names) triples under their first name, with the ObjectId and other names
+    as aliases."""
+    vocabulary = Vocabulary()
+    for object_id, display_name, names in entities:
+        entity_id = vocabulary.intern(names[0])
+        vocabulary.names[entity_id] = display_name
+        vocabulary.alias(object_id, entity_id)
+        for name in names[1:]:
+            vocabulary.alias(name, entity_id)
+    return vocabulary
+
+
+# Function to load the skill, course and location vocabularies shared by profiles and pathways
+def load_vocabularies(db):
+    # Profiles store skill and course names while pathways store their ObjectIds, and profiles store
+    # "location - state" labels while pathways store location ObjectIds
+    skills, courses, locations = fetch_concurrently(
+        lambda: list(find_documents(db["skills"], {}, {"skill_name": 1})),
+        lambda: list(find_documents(db["courses"], {}, {"course_name": 1})),
+        lambda: list(find_documents(db["locations"], {}, {"location_name": 1, "state": 1}))
+    )
+
+    return {
+        "skills": build_vocabulary((skill["_id"], skill.get("skill_name", skill["_id"]),
+                                    [skill.get("skill_name", skill["_id"])]) for skill in skills),
+        "courses": build_vocabulary((course["_id"], course.get("course_name", course["_id"]),
+                                     [course.get("course_name", course["_id"])]) for course in courses),
+        # Locations are told apart by their "location - state" label, as a location name can recur in another
+        # state. The bare name is only an alias, resolving to the first location of that name
+        "locations": build_vocabulary(
+            (location["_id"], location.get("location_name", location["_id"]),
+             [f"{location.get('location_name')} - {location.get('state')}",
+              location.get("location_name", location["_id"])])
+            for location in locations)
+    }